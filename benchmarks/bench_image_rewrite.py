@@ -0,0 +1,93 @@
+"""图片引用替换基准：比较逐页列表扫描 + 逐图片 re.sub 与页码索引 + 单次扫描替换
+
+用法: python benchmarks/bench_image_rewrite.py [--pages 1000] [--images 5000]
+
+构造一个合成的OCR结果（默认1000页、5000张图片），分别用旧算法和
+ocr_export 中的 build_image_index / rewrite_image_refs 生成保存用的markdown，
+校验两者输出一致并打印耗时。
+"""
+import re
+import sys
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ocr_export import build_image_index, page_image_targets, rewrite_image_refs
+
+
+def make_response(page_count, image_count):
+    pages = []
+    extracted_images = []
+    for page_idx in range(page_count):
+        # 图片均匀分布到各页
+        images_on_page = image_count // page_count + (1 if page_idx < image_count % page_count else 0)
+        images = [{"id": f"img-{img_idx}.jpeg"} for img_idx in range(images_on_page)]
+        paragraphs = [f"第 {page_idx + 1} 页的正文段落 {n}。" * 8 for n in range(10)]
+        paragraphs += [f"![img-{img_idx}.jpeg](img-{img_idx}.jpeg)" for img_idx in range(images_on_page)]
+        pages.append({"index": page_idx, "markdown": "\n\n".join(paragraphs), "images": images})
+        for img_idx in range(images_on_page):
+            filename = f"page{page_idx + 1}_img{img_idx + 1}.jpeg"
+            extracted_images.append({"path": f"/tmp/{filename}", "filename": filename, "page": page_idx})
+    return {"pages": pages}, extracted_images
+
+
+def rewrite_legacy(response_data, extracted_images):
+    """旧实现: 每页重新扫描整个图片列表，每个图片ID单独执行一次 re.sub"""
+    updated_markdowns = []
+    for page_idx, page in enumerate(response_data.get("pages", [])):
+        updated_md = page.get("markdown", "")
+        page_extracted_images = [img for img in extracted_images if img["page"] == page_idx]
+        for img_idx, img in enumerate(page.get("images", [])):
+            if "id" in img and img_idx < len(page_extracted_images):
+                new_img_path = f"images/{page_extracted_images[img_idx]['filename']}"
+                pattern = r'!\[(.*?)\]\(' + re.escape(img["id"]) + r'\)'
+                updated_md = re.sub(pattern, r'![\1](' + new_img_path + r')', updated_md)
+        updated_markdowns.append(updated_md)
+    return "\n\n".join(updated_markdowns)
+
+
+def rewrite_indexed(response_data, extracted_images):
+    """新实现: 建立一次页码索引，每页用一个编译好的正则和查找表完成替换"""
+    image_index = build_image_index(extracted_images)
+    updated_markdowns = []
+    for page_idx, page in enumerate(response_data.get("pages", [])):
+        targets = page_image_targets(page, image_index.get(page_idx, []))
+        replacements = {img_id: f"images/{info['filename']}" for img_id, info in targets.items()}
+        updated_markdowns.append(rewrite_image_refs(page.get("markdown", ""), replacements))
+    return "\n\n".join(updated_markdowns)
+
+
+def best_of(func, repeat, *args):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--images", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    response_data, extracted_images = make_response(args.pages, args.images)
+    legacy_time, legacy_text = best_of(rewrite_legacy, args.repeat, response_data, extracted_images)
+    indexed_time, indexed_text = best_of(rewrite_indexed, args.repeat, response_data, extracted_images)
+
+    if legacy_text != indexed_text:
+        raise SystemExit("错误: 两种实现的输出不一致")
+
+    print(f"{args.pages} 页 / {args.images} 张图片")
+    print(f"  旧实现（列表扫描 + 逐图片 re.sub）: {legacy_time * 1000:8.1f} ms")
+    print(f"  新实现（页码索引 + 单次扫描替换）:  {indexed_time * 1000:8.1f} ms")
+    print(f"  加速比: {legacy_time / indexed_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""OCR流水线端到端基准：使用离线模拟后端测量吞吐量、延迟和内存
+
+用法:
+    python benchmarks/bench_pipeline.py [--docs 20] [--pages 10] [--modes single,batch,chunked]
+    python benchmarks/bench_pipeline.py --server-url http://127.0.0.1:8765   # 经由SDK访问模拟服务器
+
+默认使用进程内的 MockBackend；指定 --server-url 时通过真实的 mistralai SDK
+访问 mock_ocr_server.py（或其他兼容服务）。每种模式在独立子进程中运行，
+输出 文档/秒、页/秒、单文档延迟 p50/p99 和峰值RSS。
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+import tempfile
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+MODES = ["single", "batch", "chunked"]
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为KB，macOS 为字节
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def make_pdfs(folder, doc_count, page_count):
+    """生成带文字和一张小图片的合成PDF"""
+    import fitz
+
+    pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 64, 64), 0)
+    pixmap.clear_with(200)
+    image_bytes = pixmap.tobytes("png")
+
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for doc_idx in range(doc_count):
+        path = os.path.join(folder, f"doc_{doc_idx:04d}.pdf")
+        with fitz.open() as pdf_document:
+            for page_idx in range(page_count):
+                page = pdf_document.new_page()
+                page.insert_text((72, 72), f"Document {doc_idx} page {page_idx + 1}", fontsize=14)
+                page.insert_image(fitz.Rect(72, 100, 200, 228), stream=image_bytes)
+            pdf_document.save(path)
+        paths.append(path)
+    return paths
+
+
+def make_backend(args):
+    if args.server_url:
+        from ocr_backend import get_backend
+        return get_backend("local", args.server_url)
+    from ocr_backend import MockBackend
+    return MockBackend(
+        latency=args.latency, page_latency=args.page_latency, error_rate=args.error_rate,
+        markdown_chars=args.markdown_chars, images_per_page=1, seed=0,
+    )
+
+
+def run_mode(mode, args):
+    from ocr_batch import process_one
+    from ocr_journal import JobJournal
+    from ocr_ratelimit import configure_rate_limit, FILES_KEY
+
+    for key in ("mistral-ocr-latest", FILES_KEY):
+        configure_rate_limit(key, rate=args.rate_limit, burst=int(args.rate_limit), max_in_flight=args.max_in_flight)
+
+    backend = make_backend(args)
+    concurrency = args.concurrency if mode == "batch" else 1
+    chunk_pages = args.chunk_pages if mode == "chunked" else 0
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        pdf_paths = make_pdfs(os.path.join(work_dir, "input"), args.docs, args.pages)
+        output_root = os.path.join(work_dir, "output")
+        os.makedirs(output_root)
+        journal = JobJournal(os.path.join(output_root, "journal.sqlite3"))
+
+        def timed(pdf_path):
+            start = time.perf_counter()
+            output_dir = os.path.join(output_root, Path(pdf_path).stem)
+            process_one(pdf_path, output_dir, backend, "mistral-ocr-latest", args.format, journal,
+                        chunk_pages=chunk_pages, chunk_workers=args.chunk_workers,
+                        inline_max_bytes=args.inline_max_kb * 1024, image_format=args.image_format,
+                        image_max_size=args.image_max_size)
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            latencies = list(executor.map(timed, pdf_paths))
+        elapsed = time.perf_counter() - start
+        journal.close()
+
+    return {
+        "mode": mode,
+        "docs_per_sec": args.docs / elapsed,
+        "pages_per_sec": args.docs * args.pages / elapsed,
+        "p50": percentile(latencies, 50),
+        "p99": percentile(latencies, 99),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modes", default=",".join(MODES), help="要运行的模式（逗号分隔）")
+    parser.add_argument("--docs", type=int, default=20, help="文档数")
+    parser.add_argument("--pages", type=int, default=10, help="每个文档的页数")
+    parser.add_argument("--concurrency", type=int, default=8, help="batch 模式的并发文档数")
+    parser.add_argument("--chunk-pages", type=int, default=2, help="chunked 模式的分块页数")
+    parser.add_argument("--chunk-workers", type=int, default=4, help="chunked 模式的分块并发数")
+    parser.add_argument("--format", default="markdown", help="输出格式")
+    parser.add_argument("--inline-max-kb", type=int, default=4096,
+                        help="不超过此大小的文档以data URL内联发送，0 表示总是上传")
+    parser.add_argument("--image-format", default="original", help="提取图片的转换格式（original/jpeg/png/webp）")
+    parser.add_argument("--image-max-size", type=int, default=0, help="图片最长边上限（像素），0 表示不缩小")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟后端每次调用的延迟（秒）")
+    parser.add_argument("--page-latency", type=float, default=0.01, help="模拟OCR每页额外延迟（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模拟429/503错误的概率")
+    parser.add_argument("--markdown-chars", type=int, default=2000, help="每页markdown字符数")
+    parser.add_argument("--rate-limit", type=float, default=1000.0, help="每秒API请求数上限")
+    parser.add_argument("--max-in-flight", type=int, default=64, help="同时进行中的API请求数上限")
+    parser.add_argument("--server-url", help="通过SDK访问的模拟服务器地址")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    if args.child:
+        print(json.dumps(run_mode(args.child, args)))
+        return
+
+    print(f"{args.docs} 个文档 × {args.pages} 页，后端: {args.server_url or 'MockBackend'}")
+    print(f"{'模式':<8} {'文档/秒':>9} {'页/秒':>9} {'p50(s)':>8} {'p99(s)':>8} {'峰值RSS(MB)':>12}")
+    for mode in args.modes.split(","):
+        output = subprocess.run(
+            [sys.executable, __file__, *sys.argv[1:], "--child", mode],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{mode:<8} {result['docs_per_sec']:>9.2f} {result['pages_per_sec']:>9.1f} "
+              f"{result['p50']:>8.3f} {result['p99']:>8.3f} {result['peak_rss_mb']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""启动耗时基准：用 python -X importtime 测量各入口模块的导入时间和加载的重型依赖
+
+用法:
+    python benchmarks/bench_startup.py [--repeat 5] [--top 10]
+    python benchmarks/bench_startup.py --check [--budget-ms 300]   # 用于CI，防止启动变慢
+
+每个入口在全新的子进程中导入，取多次运行的中位数。PyMuPDF、mistralai、markdown 等
+应在首次使用时才加载；--check 时若入口提前导入了它们，或导入耗时超过预算，返回非零退出码。
+"""
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# 入口 → 导入的模块
+ENTRY_POINTS = {
+    "gui": "ocr_gui",
+    "batch": "ocr_batch",
+    "watch": "ocr_watch",
+    "search": "ocr_index",
+    "dispatch": "ocr",
+}
+
+# 启动时不应加载的重型依赖（顶层包名）
+DEFERRED_PACKAGES = ("fitz", "pymupdf", "mistralai", "httpx", "pydantic", "markdown")
+# 只有图形界面可以加载的包
+GUI_PACKAGES = ("PyQt6",)
+
+
+def parse_importtime(stderr):
+    """解析 -X importtime 的输出，返回 {模块名: (自身微秒, 累计微秒)}"""
+    timings = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def measure(module):
+    """在新进程中导入 module，返回 (导入耗时毫秒, {模块名: (自身微秒, 累计微秒)})"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT, capture_output=True, text=True,
+        env=dict(os.environ, PYTHONDONTWRITEBYTECODE="1"),
+    )
+    timings = parse_importtime(result.stderr)
+    if result.returncode != 0 or module not in timings:
+        raise RuntimeError(f"导入 {module} 失败:\n{result.stderr[-2000:]}")
+    return timings[module][1] / 1000, timings
+
+
+def loaded_packages(timings, packages):
+    return sorted({name.split(".")[0] for name in timings} & set(packages))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", default=",".join(ENTRY_POINTS), help="要测量的入口（逗号分隔）")
+    parser.add_argument("--repeat", type=int, default=5, help="每个入口重复测量的次数")
+    parser.add_argument("--top", type=int, default=8, help="列出累计耗时最长的前N个导入")
+    parser.add_argument("--check", action="store_true", help="提前加载了重型依赖或超出预算时返回非零")
+    parser.add_argument("--budget-ms", type=float, default=300.0, help="--check 时每个入口的导入耗时上限（毫秒）")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    failures = []
+
+    print(f"{'入口':<10} {'模块':<12} {'导入(ms)':>10} {'最慢(ms)':>10}  提前加载的重型依赖")
+    for entry in args.entries.split(","):
+        module = ENTRY_POINTS[entry]
+        runs = [measure(module) for _ in range(args.repeat)]
+        elapsed = [ms for ms, _ in runs]
+        timings = runs[-1][1]
+
+        forbidden = DEFERRED_PACKAGES if entry == "gui" else DEFERRED_PACKAGES + GUI_PACKAGES
+        eager = loaded_packages(timings, forbidden)
+        print(f"{entry:<10} {module:<12} {statistics.median(elapsed):>10.1f} {max(elapsed):>10.1f}  "
+              f"{', '.join(eager) or '-'}")
+
+        slowest = sorted(
+            ((cumulative, name) for name, (_, cumulative) in timings.items() if name != module),
+            reverse=True,
+        )[:args.top]
+        for cumulative, name in slowest:
+            print(f"{'':<24}{cumulative / 1000:>10.1f}  {name}")
+
+        if eager:
+            failures.append(f"{entry}: 启动时导入了 {', '.join(eager)}")
+        if statistics.median(elapsed) > args.budget_ms:
+            failures.append(f"{entry}: 导入耗时 {statistics.median(elapsed):.1f}ms 超出预算 {args.budget_ms:g}ms")
+
+    if args.check and failures:
+        print("\n".join(["", "检查未通过:", *failures]), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
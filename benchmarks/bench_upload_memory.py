@@ -0,0 +1,124 @@
+"""上传内存占用基准：比较整体读入后上传与 upload_file 流式上传的峰值RSS
+
+用法:
+    python benchmarks/bench_upload_memory.py [--sizes 50,200,500]            # 经由 mistralai SDK
+    python benchmarks/bench_upload_memory.py --backend mock                   # 进程内 MockBackend
+
+默认在本进程中启动 mock_ocr_server.py，子进程通过 get_backend(server_url=...) 以真实的
+SDK/httpx multipart 请求上传，因此测到的是客户端实际的缓冲行为（服务器在父进程中，
+不计入子进程的内存）。每种方式在独立子进程中运行，输出子进程的峰值RSS（ru_maxrss），
+并核对上传时顺带计算的哈希与文件的SHA-256一致。
+"""
+import os
+import sys
+import argparse
+import resource
+import subprocess
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为KB，macOS 为字节
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def make_backend(server_url):
+    if server_url:
+        from ocr_backend import get_backend
+        return get_backend("local", server_url)
+    from ocr_backend import MockBackend
+    return MockBackend(latency=0, page_latency=0)
+
+
+def upload_read_bytes(backend, file_path):
+    """旧方式: 读入整个文件，单独计算哈希后把 bytes 交给后端上传"""
+    from ocr_cache import file_sha256
+    digest = file_sha256(file_path)
+    file_id = backend.upload(Path(file_path).stem, Path(file_path).read_bytes())
+    return file_id, digest
+
+
+def upload_streaming(backend, file_path):
+    """新方式: upload_file 以 HashingReader 流式上传，读取的同时计算哈希"""
+    from ocr_pipeline import upload_file
+    return upload_file(backend, file_path)
+
+
+MODES = {
+    "read_bytes": upload_read_bytes,
+    "streaming": upload_streaming,
+}
+
+
+def run_child(mode, file_path, server_url):
+    from ocr_cache import file_sha256
+    backend = make_backend(server_url)
+    file_id, digest = MODES[mode](backend, file_path)
+    backend.delete(file_id)
+    if digest != file_sha256(file_path):
+        raise SystemExit(f"{mode}: 上传内容的哈希与文件不一致")
+    print(f"{peak_rss_mb():.1f}")
+
+
+def make_file(path, size_mb):
+    block = os.urandom(1024 * 1024)
+    with open(path, "wb") as f:
+        for _ in range(size_mb):
+            f.write(block)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="50,200", help="测试文件大小列表，单位MB（逗号分隔）")
+    parser.add_argument("--backend", choices=["sdk", "mock"], default="sdk",
+                        help="sdk: 经由 mistralai SDK 访问本地模拟服务器（默认）；mock: 进程内 MockBackend")
+    parser.add_argument("--server-url", help="使用已运行的兼容服务，而不是在本进程中启动模拟服务器")
+    parser.add_argument("--child", nargs=3, metavar=("MODE", "FILE", "URL"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        mode, file_path, server_url = args.child
+        run_child(mode, file_path, server_url or None)
+        return 0
+
+    server = None
+    server_url = ""
+    if args.backend == "sdk":
+        try:
+            import mistralai  # noqa: F401
+        except ImportError:
+            print("错误: --backend sdk 需要安装 mistralai，或使用 --backend mock", file=sys.stderr)
+            return 2
+        server_url = args.server_url
+        if not server_url:
+            from ocr_backend import MockBackend
+            from mock_ocr_server import start_in_thread
+            server, server_url = start_in_thread(MockBackend(latency=0, page_latency=0))
+
+    print(f"后端: {server_url or 'MockBackend'}")
+    print(f"{'文件大小':>8}  {'read_bytes 峰值RSS':>20}  {'streaming 峰值RSS':>20}")
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for size_mb in (int(size) for size in args.sizes.split(",")):
+                file_path = os.path.join(temp_dir, f"input_{size_mb}mb.pdf")
+                make_file(file_path, size_mb)
+                results = {}
+                for mode in MODES:
+                    output = subprocess.run(
+                        [sys.executable, __file__, "--child", mode, file_path, server_url],
+                        check=True, capture_output=True, text=True,
+                    ).stdout
+                    results[mode] = float(output.strip())
+                print(f"{size_mb:>6}MB  {results['read_bytes']:>18.1f}MB  {results['streaming']:>18.1f}MB")
+    finally:
+        if server is not None:
+            server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,7 +7,9 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=['fitz', 'markdown', 'mistralai', 'PyQt6'],
+    # 各子命令和重型依赖都在函数内按需导入，显式列出以确保被打包
+    hiddenimports=['fitz', 'markdown', 'mistralai', 'httpx', 'PyQt6',
+                   'ocr_gui', 'ocr_batch', 'ocr_watch', 'ocr_index'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -0,0 +1,149 @@
+"""本地模拟 Mistral OCR API 服务器，用于离线开发和基准测试
+
+实现流水线用到的四个接口（上传文件、获取签名URL、OCR、删除文件），
+内部由 ocr_backend.MockBackend 生成结果，可配置延迟、错误率和响应大小。
+真实的 mistralai SDK 可以通过 server_url 指向它：
+
+    python mock_ocr_server.py --port 8765 --latency 0.2 --error-rate 0.05
+    python ocr.py batch <目录> --server-url http://127.0.0.1:8765
+"""
+import re
+import sys
+import json
+import time
+import argparse
+import threading
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from ocr_backend import MockBackend, MockApiError
+
+
+class MockOcrRequestHandler(BaseHTTPRequestHandler):
+    backend = None  # 由 make_server 设置
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status_code, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length) if length else b""
+
+    def _handle(self, func):
+        try:
+            status_code, payload = func()
+        except MockApiError as e:
+            status_code, payload = e.status_code, {"message": str(e)}
+        except Exception as e:
+            status_code, payload = 500, {"message": str(e)}
+        self._send_json(status_code, payload)
+
+    def do_POST(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/v1/files":
+            self._handle(self._upload)
+        elif path == "/v1/ocr":
+            self._handle(self._ocr)
+        else:
+            self._send_json(404, {"message": "not found"})
+
+    def do_GET(self):
+        match = re.fullmatch(r"/v1/files/([^/]+)/url", self.path.split("?", 1)[0])
+        if match:
+            self._handle(lambda: (200, {"url": self.backend.get_signed_url(match.group(1))}))
+        else:
+            self._send_json(404, {"message": "not found"})
+
+    def do_DELETE(self):
+        match = re.fullmatch(r"/v1/files/([^/]+)", self.path.split("?", 1)[0])
+        if match:
+            def _delete():
+                self.backend.delete(match.group(1))
+                return 200, {"id": match.group(1), "object": "file", "deleted": True}
+            self._handle(_delete)
+        else:
+            self._send_json(404, {"message": "not found"})
+
+    def _upload(self):
+        body = self._read_body()
+        header = f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode("utf-8")
+        message = BytesParser(policy=HTTP).parsebytes(header + body)
+        file_name, content = "upload", b""
+        for part in message.iter_parts():
+            if part.get_filename():
+                file_name, content = part.get_filename(), part.get_payload(decode=True)
+        file_id = self.backend.upload(file_name, content)
+        return 200, {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": file_name,
+            "purpose": "ocr",
+            "sample_type": "ocr_input",
+            "source": "upload",
+            "num_lines": None,
+            "mimetype": "application/pdf",
+            "signature": None,
+        }
+
+    def _ocr(self):
+        request = json.loads(self._read_body() or b"{}")
+        document = request.get("document", {})
+        document_url = document.get("document_url") or document.get("image_url") or ""
+        if isinstance(document_url, dict):
+            document_url = document_url.get("url", "")
+        image = document.get("type") == "image_url"
+        return 200, self.backend.process(document_url, request.get("model", "mistral-ocr-latest"), image=image)
+
+
+def make_server(backend, host="127.0.0.1", port=8765):
+    """创建（不启动）模拟服务器，port=0 时自动选择空闲端口"""
+    handler = type("BoundMockOcrRequestHandler", (MockOcrRequestHandler,), {"backend": backend})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def start_in_thread(backend, host="127.0.0.1", port=0):
+    """在后台线程中启动服务器，返回 (server, base_url)"""
+    server = make_server(backend, host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本地模拟 Mistral OCR API 服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="每次调用的基础延迟（秒）")
+    parser.add_argument("--page-latency", type=float, default=0.01, help="OCR时每页额外延迟（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回429/503错误的概率")
+    parser.add_argument("--markdown-chars", type=int, default=2000, help="每页markdown字符数")
+    parser.add_argument("--images-per-page", type=int, default=1, help="每页图片数")
+    args = parser.parse_args(argv)
+
+    backend = MockBackend(
+        latency=args.latency, page_latency=args.page_latency, error_rate=args.error_rate,
+        markdown_chars=args.markdown_chars, images_per_page=args.images_per_page,
+    )
+    server = make_server(backend, args.host, args.port)
+    print(f"模拟OCR服务器已启动: http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
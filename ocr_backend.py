@@ -0,0 +1,240 @@
+import os
+import base64
+import time
+import uuid
+import random
+import atexit
+import tempfile
+import threading
+from ocr_result import OcrResult
+
+
+# 共享HTTP连接池的参数: 保持长连接，避免每个请求重新建立TCP/TLS连接
+HTTP_MAX_CONNECTIONS = 32
+HTTP_KEEPALIVE_EXPIRY = 60.0
+# OCR大文档时服务端可能长时间不返回数据，读超时需足够长
+HTTP_TIMEOUT = 300.0
+HTTP_CONNECT_TIMEOUT = 10.0
+
+
+class MistralBackend:
+    """OCR后端: 通过 mistralai SDK 调用 Mistral API
+
+    流水线只依赖 upload / get_signed_url / process / delete 四个方法，
+    任何实现了这些方法的对象（如 MockBackend）都可以替换它。
+    """
+
+    def __init__(self, client, http_client=None):
+        self.client = client
+        self.http_client = http_client
+
+    def upload(self, file_name, content):
+        """上传文件内容（bytes或可读文件对象），返回 file_id"""
+        uploaded_file = self.client.files.upload(
+            file={
+                "file_name": file_name,
+                "content": content,
+            },
+            purpose="ocr",
+        )
+        return uploaded_file.id
+
+    def get_signed_url(self, file_id):
+        return self.client.files.get_signed_url(file_id=file_id, expiry=1).url
+
+    def process(self, document_url, model, image=False):
+        """对文档URL调用OCR，返回 OcrResult（可按 dict 读取的 response_dict）
+
+        document_url 可以是签名URL或 base64 data URL；image=True 时作为图片发送。
+        """
+        from mistralai import DocumentURLChunk, ImageURLChunk
+        if image:
+            document = ImageURLChunk(image_url=document_url)
+        else:
+            document = DocumentURLChunk(document_url=document_url)
+        pdf_response = self.client.ocr.process(
+            document=document,
+            model=model,
+            include_image_base64=False,  # 降低API费用
+        )
+        # 逐页转换为紧凑记录，不生成整份文档的嵌套dict
+        return OcrResult.from_model(pdf_response)
+
+    def delete(self, file_id):
+        self.client.files.delete(file_id=file_id)
+
+    def close(self):
+        """关闭底层HTTP连接池"""
+        if self.http_client is not None:
+            self.http_client.close()
+
+
+def create_backend(api_key, server_url=None):
+    """创建新的 Mistral 后端，server_url 可指向本地模拟服务器等兼容服务
+
+    后端自带可在多个线程间共享的长连接池；一般应通过 get_backend 复用已有实例。
+    """
+    # mistralai SDK（连同 httpx、pydantic）导入较慢，创建第一个后端时才导入
+    import httpx
+    from mistralai import Mistral
+    http_client = httpx.Client(
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+    )
+    if server_url:
+        client = Mistral(api_key=api_key, server_url=server_url, client=http_client)
+    else:
+        client = Mistral(api_key=api_key, client=http_client)
+    return MistralBackend(client, http_client)
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(api_key, server_url=None):
+    """返回进程内按 (API Key, 服务地址) 复用的后端，所有工作线程和批处理任务共用连接"""
+    key = (api_key, server_url)
+    with _backends_lock:
+        backend = _backends.get(key)
+        if backend is None:
+            backend = _backends[key] = create_backend(api_key, server_url)
+        return backend
+
+
+def close_backends():
+    """关闭所有复用的后端连接，在程序退出时调用"""
+    with _backends_lock:
+        backends = list(_backends.values())
+        _backends.clear()
+    for backend in backends:
+        try:
+            backend.close()
+        except Exception:
+            pass
+
+
+atexit.register(close_backends)
+
+
+class MockApiError(Exception):
+    """模拟后端返回的API错误，带有 status_code，可被重试逻辑识别"""
+
+    def __init__(self, status_code, message):
+        super().__init__(f"API error occurred: Status {status_code}. {message}")
+        self.status_code = status_code
+
+
+class MockBackend:
+    """离线模拟后端，不访问网络，用于基准测试和离线开发
+
+    latency: 每次API调用的基础延迟（秒）；page_latency: OCR时每页额外延迟；
+    error_rate: 每次调用以该概率返回 429/503 错误；
+    markdown_chars / images_per_page: 控制每页响应的大小。
+    """
+
+    def __init__(self, latency=0.05, page_latency=0.01, error_rate=0.0,
+                 markdown_chars=2000, images_per_page=1, seed=None):
+        self.latency = latency
+        self.page_latency = page_latency
+        self.error_rate = error_rate
+        self.markdown_chars = markdown_chars
+        self.images_per_page = images_per_page
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._files = {}
+        self._storage = tempfile.mkdtemp(prefix="mock_ocr_files_")
+
+    def _call(self, delay=0.0):
+        with self._lock:
+            failed = self._random.random() < self.error_rate
+            status_code = self._random.choice([429, 503])
+        time.sleep(self.latency + delay)
+        if failed:
+            raise MockApiError(status_code, "simulated failure")
+
+    def upload(self, file_name, content):
+        self._call()
+        file_id = uuid.uuid4().hex
+        path = os.path.join(self._storage, file_id)
+        # 与真实客户端一样分块读取上传内容
+        with open(path, "wb") as f:
+            if isinstance(content, bytes):
+                f.write(content)
+            else:
+                for chunk in iter(lambda: content.read(64 * 1024), b""):
+                    f.write(chunk)
+        with self._lock:
+            self._files[file_id] = {"path": path, "file_name": file_name}
+        return file_id
+
+    def get_signed_url(self, file_id):
+        self._call()
+        with self._lock:
+            if file_id not in self._files:
+                raise MockApiError(404, "file not found")
+        return f"mock://files/{file_id}"
+
+    def process(self, document_url, model, image=False):
+        if document_url.startswith("data:"):
+            # 内联发送的 base64 内容
+            content = base64.b64decode(document_url.split(",", 1)[1])
+            page_count = 1 if image else self._page_count(stream=content)
+            doc_size_bytes = len(content)
+        else:
+            file_id = document_url.rsplit("/", 1)[-1]
+            with self._lock:
+                entry = self._files.get(file_id)
+            page_count = self._page_count(entry["path"]) if entry and not image else 1
+            doc_size_bytes = os.path.getsize(entry["path"]) if entry else 0
+        self._call(self.page_latency * page_count)
+        return self.make_response(model, page_count, doc_size_bytes)
+
+    def delete(self, file_id):
+        self._call()
+        with self._lock:
+            entry = self._files.pop(file_id, None)
+        if entry:
+            os.remove(entry["path"])
+
+    def _page_count(self, path=None, stream=None):
+        try:
+            import fitz
+            pdf_document = fitz.open(path) if path else fitz.open(stream=stream, filetype="pdf")
+            with pdf_document:
+                return len(pdf_document)
+        except Exception:
+            return 1
+
+    def make_response(self, model, page_count, doc_size_bytes=0):
+        """生成与 OCRResponse 结构相同的合成结果"""
+        pages = []
+        for page_idx in range(page_count):
+            images = [
+                {
+                    "id": f"img-{img_idx}.jpeg",
+                    "top_left_x": 0, "top_left_y": 0,
+                    "bottom_right_x": 100, "bottom_right_y": 100,
+                    "image_base64": None,
+                }
+                for img_idx in range(self.images_per_page)
+            ]
+            text = f"Page {page_idx + 1} lorem ipsum dolor sit amet. "
+            body = (text * (self.markdown_chars // len(text) + 1))[:self.markdown_chars]
+            image_refs = "\n\n".join(f"![{img['id']}]({img['id']})" for img in images)
+            pages.append({
+                "index": page_idx,
+                "markdown": f"# Page {page_idx + 1}\n\n{body}\n\n{image_refs}".rstrip(),
+                "images": images,
+                "dimensions": {"dpi": 200, "height": 2200, "width": 1700},
+            })
+        return {
+            "pages": pages,
+            "model": model,
+            "usage_info": {"pages_processed": page_count, "doc_size_bytes": doc_size_bytes},
+            "document_annotation": None,
+        }
@@ -0,0 +1,348 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+from pathlib import Path
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from ocr_pipeline import DEFAULT_CHUNK_WORKERS, DEFAULT_INLINE_MAX_BYTES, IMAGE_MIME_TYPES
+from ocr_export import save_ocr_result
+from ocr_cache import OcrCache, file_sha256, DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES
+from ocr_index import SearchIndex, DEFAULT_INDEX_PATH
+from ocr_images import transcode_images, image_format_error, IMAGE_FORMATS, DEFAULT_IMAGE_QUALITY
+from ocr_backend import get_backend, close_backends
+from ocr_metrics import get_metrics
+from ocr_hybrid import hybrid_result_key
+from ocr_ratelimit import configure_rate_limit, FILES_KEY, DEFAULT_RATE, DEFAULT_MAX_IN_FLIGHT
+from ocr_journal import JobJournal, run_ocr_resumable, cleanup_orphaned_uploads, JOURNAL_FILENAME
+
+
+DEFAULT_MODEL = "mistral-ocr-latest"
+DEFAULT_CONCURRENCY = 4
+
+
+# 批处理接受的输入: PDF 和可直接OCR的独立图片
+DOCUMENT_EXTENSIONS = {".pdf", *IMAGE_MIME_TYPES}
+
+
+def find_documents(input_dir, exclude=None):
+    """递归查找目录树中的所有PDF和图片文件（按路径排序）
+
+    exclude 为位于输入目录内的输出根目录时跳过其中的文件，不会把之前提取的图片当作文档。
+    """
+    exclude = Path(exclude).resolve() if exclude else None
+    documents = []
+    for dirpath, dirnames, filenames in os.walk(input_dir):
+        if exclude is not None:
+            dirnames[:] = [name for name in dirnames if Path(dirpath, name).resolve() != exclude]
+        documents.extend(
+            Path(dirpath, filename) for filename in filenames
+            if Path(filename).suffix.lower() in DOCUMENT_EXTENSIONS
+        )
+    return sorted(documents)
+
+
+def output_dir_for(pdf_path, input_dir, output_root):
+    """按输入目录结构为每个文档生成独立的输出目录
+
+    PDF 去掉扩展名（a.pdf → a/），图片保留扩展名（a.png → a.png/），同名的PDF和图片不会写入同一目录；
+    去掉扩展名后仍像文档文件名的PDF（a.png.pdf）同样保留完整文件名。
+    """
+    relative = Path(pdf_path).relative_to(input_dir)
+    if relative.suffix.lower() == ".pdf" and Path(relative.stem).suffix.lower() not in DOCUMENT_EXTENSIONS:
+        relative = relative.with_suffix("")
+    return Path(output_root) / relative
+
+
+def output_options_key(output_format, image_format="original", image_quality=DEFAULT_IMAGE_QUALITY,
+                       image_max_size=0):
+    """影响输出文件的选项，记录在任务日志中；其中任何一项变化时已完成的文档需要重新保存"""
+    if image_format == "original" and not image_max_size:
+        # 不转换图片时压缩质量不起作用
+        image_quality = None
+    return json.dumps([output_format, image_format, image_quality, image_max_size])
+
+
+def process_one(pdf_path, output_dir, backend, model, output_format, journal, cache=None,
+                chunk_pages=0, chunk_workers=DEFAULT_CHUNK_WORKERS, lazy_images=False,
+                inline_max_bytes=DEFAULT_INLINE_MAX_BYTES, hybrid=False, index=None, image_format="original",
+                image_quality=DEFAULT_IMAGE_QUALITY, image_max_size=0):
+    """处理单个PDF并立即写出结果，返回输出文件路径；已完成且未变化的文档返回 None
+
+    各阶段的耗时记录在 ocr_metrics 中，并以该PDF的绝对路径标记所属文档。
+    传入 index（SearchIndex）时，保存后把各页文字加入全文索引；
+    image_format 不为 "original" 或 image_max_size 大于0时，保存前转换提取的图片。
+    """
+    metrics = get_metrics()
+    job_key = os.path.abspath(pdf_path)
+    with metrics.document(job_key), metrics.stage("document") as stage:
+        # 大小和修改时间与上次计算哈希时完全一致的已保存文档沿用日志中的哈希，重新运行整批任务时
+        # 不必逐个读取文件；其余文档需要先算出哈希才能判断是否跳过和查找缓存，上传时再顺带核对一次。
+        # 文件状态在计算哈希之前取得，处理期间被改写的文件下次运行时状态不一致，会重新计算哈希
+        file_stat = os.stat(pdf_path)
+        pdf_sha256 = journal.saved_sha256(job_key, file_stat) or file_sha256(pdf_path)
+        output_options = output_options_key(output_format, image_format, image_quality, image_max_size)
+        if journal.completed_output(job_key, pdf_sha256, hybrid_result_key(model, hybrid), output_options):
+            stage.status = "skipped"
+            metrics.count_document("skipped")
+            return None
+
+        os.makedirs(output_dir, exist_ok=True)
+        # 图片先提取到输出目录下的工作文件夹，中断后可直接复用
+        image_folder = os.path.join(output_dir, ".temp_images")
+        try:
+            response_dict, extracted_images = run_ocr_resumable(
+                backend, str(pdf_path), model, image_folder, journal, cache=cache,
+                chunk_pages=chunk_pages, chunk_workers=chunk_workers, lazy_images=lazy_images,
+                pdf_sha256=pdf_sha256, inline_max_bytes=inline_max_bytes, hybrid=hybrid,
+            )
+            extracted_images = transcode_images(
+                extracted_images, os.path.join(image_folder, "converted"), image_format, image_quality,
+                image_max_size,
+            )
+            # 图片以硬链接放到输出目录而不是移动：标记为已保存之前任务日志仍引用工作文件夹中的原图，
+            # 索引失败后重新运行时还要用它们转换；工作文件夹在标记为已保存后才删除
+            output_file = save_ocr_result(response_dict, extracted_images, str(output_dir), output_format)
+            if index is not None:
+                # 索引失败时不标记为已保存，下次运行会重新处理（通常直接命中缓存）
+                with metrics.stage("index", pages=len(response_dict.get("pages", []))):
+                    index.add_result(output_file, response_dict, extracted_images, source_path=job_key,
+                                     model=hybrid_result_key(model, hybrid), sha256=pdf_sha256)
+            journal.mark_saved(job_key, output_file, output_options, file_stat)
+        except Exception as e:
+            journal.record_failure(job_key, str(e))
+            metrics.count_document("failed")
+            raise
+
+        shutil.rmtree(image_folder, ignore_errors=True)
+        stage.pages = len(response_dict.get("pages", []))
+        metrics.count_document("succeeded")
+        return output_file
+
+
+def run_batch(input_dir, output_root, backend, model=DEFAULT_MODEL, output_format="markdown",
+              concurrency=DEFAULT_CONCURRENCY, cache=None, chunk_pages=0,
+              chunk_workers=DEFAULT_CHUNK_WORKERS, restart=False, lazy_images=False, log=print,
+              metrics_file=None, inline_max_bytes=DEFAULT_INLINE_MAX_BYTES, hybrid=False, index=None,
+              image_format="original", image_quality=DEFAULT_IMAGE_QUALITY, image_max_size=0):
+    """以有界线程池并发处理目录树中的全部PDF和图片，返回 (成功数, 失败列表)
+
+    backend 为 ocr_backend 中的后端实例，所有工作线程共用。
+    metrics_file 不为空时，每完成一个文档就把 Prometheus 格式的指标写入该文件；
+    index 不为空时，每个保存的结果都会加入全文索引。
+
+    每个文档的处理阶段记录在 <输出目录>/.ocr_journal.sqlite3 中，
+    重新运行同一批任务时跳过已完成的文档，未完成的从最后完成的阶段继续；
+    restart=True 时丢弃已有记录重新开始。
+    """
+    pdf_files = find_documents(input_dir, exclude=output_root)
+    if not pdf_files:
+        log(f"未在 {input_dir} 中找到PDF或图片文件")
+        return 0, []
+
+    os.makedirs(output_root, exist_ok=True)
+    journal_path = os.path.join(output_root, JOURNAL_FILENAME)
+    if restart and os.path.exists(journal_path):
+        os.remove(journal_path)
+    journal = JobJournal(journal_path)
+    cleanup_orphaned_uploads(backend, journal, log)
+
+    log(f"共找到 {len(pdf_files)} 个文档，并发数 {concurrency}")
+    succeeded = 0
+    skipped = 0
+    failed = []
+    start = time.monotonic()
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = {
+                executor.submit(
+                    process_one, pdf_path, output_dir_for(pdf_path, input_dir, output_root),
+                    backend, model, output_format, journal, cache, chunk_pages, chunk_workers,
+                    lazy_images, inline_max_bytes, hybrid, index, image_format, image_quality, image_max_size,
+                ): pdf_path
+                for pdf_path in pdf_files
+            }
+            # 每个文档完成后立即输出结果，而不是等待整批结束
+            for done, future in enumerate(as_completed(futures), 1):
+                pdf_path = futures[future]
+                try:
+                    output_file = future.result()
+                    succeeded += 1
+                    if output_file is None:
+                        skipped += 1
+                        log(f"[{done}/{len(pdf_files)}] 跳过（已完成） {pdf_path}")
+                    else:
+                        log(f"[{done}/{len(pdf_files)}] 完成 {pdf_path} -> {output_file}")
+                except Exception as e:
+                    failed.append((pdf_path, str(e)))
+                    log(f"[{done}/{len(pdf_files)}] 失败 {pdf_path}: {str(e)}")
+                if metrics_file:
+                    get_metrics().write_prometheus_file(metrics_file)
+    finally:
+        journal.close()
+
+    elapsed = time.monotonic() - start
+    log(f"处理完成: 成功 {succeeded}（其中跳过 {skipped}），失败 {len(failed)}，耗时 {elapsed:.1f} 秒")
+    return succeeded, failed
+
+
+def add_pipeline_arguments(parser):
+    """添加批处理和监视模式共用的OCR流水线参数"""
+    parser.add_argument("-j", "--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"同时处理的文档数（默认: {DEFAULT_CONCURRENCY}）")
+    parser.add_argument("-m", "--model", default=DEFAULT_MODEL, help=f"OCR 模型（默认: {DEFAULT_MODEL}）")
+    parser.add_argument("-f", "--format", default="markdown",
+                        choices=["markdown", "html", "json", "jsonl"], help="输出格式（默认: markdown）")
+    parser.add_argument("--api-key", help="Mistral API Key（默认读取环境变量MISTRAL_API_KEY）")
+    parser.add_argument("--server-url", help="兼容的API地址，如本地模拟服务器 http://127.0.0.1:8765")
+    parser.add_argument("--no-cache", action="store_true", help="跳过OCR结果缓存，强制重新调用API")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help=f"缓存目录（默认: {DEFAULT_CACHE_DIR}）")
+    parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help="缓存容量上限，单位MB，超出后按LRU淘汰")
+    parser.add_argument("--chunk-pages", type=int, default=0,
+                        help="大文档按此页数拆分后并发OCR（默认: 0，不拆分）")
+    parser.add_argument("--chunk-workers", type=int, default=DEFAULT_CHUNK_WORKERS,
+                        help=f"单个文档内同时处理的分块数（默认: {DEFAULT_CHUNK_WORKERS}）")
+    parser.add_argument("--inline-max-kb", type=int, default=DEFAULT_INLINE_MAX_BYTES // 1024,
+                        help="不超过此大小的文件以data URL直接发送，跳过上传（默认: "
+                             f"{DEFAULT_INLINE_MAX_BYTES // 1024}，0 表示总是上传）")
+    parser.add_argument("--hybrid", action="store_true",
+                        help="混合模式: 带文字层的页直接读取，只把扫描页发送OCR")
+    parser.add_argument("--image-format", default="original", choices=list(IMAGE_FORMATS),
+                        help="把提取的图片转换为此格式（默认: original，保留PDF中的原始数据；webp 需要 Pillow）")
+    parser.add_argument("--image-quality", type=int, default=DEFAULT_IMAGE_QUALITY,
+                        help=f"JPEG/WebP 的压缩质量 1-100（默认: {DEFAULT_IMAGE_QUALITY}）")
+    parser.add_argument("--image-max-size", type=int, default=0,
+                        help="图片最长边超过此像素数时缩小（默认: 0，不缩小）")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH,
+                        help=f"保存的结果加入此全文索引，用 search 命令检索（默认: {DEFAULT_INDEX_PATH}）")
+    parser.add_argument("--no-index", action="store_true", help="不把结果加入全文索引")
+    parser.add_argument("--lazy-images", action="store_true",
+                        help="OCR完成后只提取结果中含有图片的页")
+    parser.add_argument("--rate-limit", type=float, default=DEFAULT_RATE,
+                        help=f"每秒API请求数上限，遇到429/5xx时自动降低（默认: {DEFAULT_RATE:g}）")
+    parser.add_argument("--burst", type=int,
+                        help="启动时最多可连续发出的请求数（默认: 按 --rate-limit 取1秒的请求数，至少为1）")
+    parser.add_argument("--max-in-flight", type=int, default=DEFAULT_MAX_IN_FLIGHT,
+                        help=f"同时进行中的API请求数上限，按AIMD自动调整（默认: {DEFAULT_MAX_IN_FLIGHT}）")
+    parser.add_argument("--metrics-log", help="以JSON行写出每个阶段的耗时事件（- 表示标准错误）")
+    parser.add_argument("--metrics-file", help="Prometheus 文本格式的指标文件，每完成一个文档更新一次")
+    parser.add_argument("--metrics-port", type=int,
+                        help="在该端口提供 Prometheus /metrics 接口（仅监听本机）")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="mistral-ocr batch",
+        description="无界面批量OCR：递归处理目录中的所有PDF和图片（PNG/JPEG/TIFF）",
+    )
+    parser.add_argument("input_dir", help="包含PDF或图片文件的输入目录")
+    parser.add_argument("-o", "--output", help="输出根目录（默认: <输入目录>_ocr）")
+    parser.add_argument("--restart", action="store_true",
+                        help="丢弃输出目录中的任务日志，从头处理所有文档（默认从上次中断处继续）")
+    add_pipeline_arguments(parser)
+    return parser
+
+
+def resolve_api_key(args):
+    """命令行参数优先，其次环境变量；使用本地模拟服务器时可以省略"""
+    api_key = args.api_key or os.environ.get("MISTRAL_API_KEY")
+    if not api_key and args.server_url:
+        # 本地模拟服务器不校验 API Key
+        api_key = "local"
+    return api_key
+
+
+def pipeline_argument_error(args):
+    """检查共用参数，有误时返回错误信息"""
+    if args.inline_max_kb < 0:
+        return "--inline-max-kb 不能为负数"
+    if args.concurrency < 1 or args.chunk_workers < 1 or args.max_in_flight < 1:
+        return "并发数必须大于0"
+    if args.rate_limit <= 0:
+        return "--rate-limit 必须大于0"
+    if args.burst is not None and args.burst < 1:
+        return "--burst 必须大于0"
+    if not 1 <= args.image_quality <= 100:
+        return "--image-quality 必须在 1-100 之间"
+    if args.image_max_size < 0:
+        return "--image-max-size 不能为负数"
+    return image_format_error(args.image_format)
+
+
+def pipeline_options(args):
+    """process_one 的流水线选项"""
+    return {
+        "chunk_pages": args.chunk_pages,
+        "chunk_workers": args.chunk_workers,
+        "lazy_images": args.lazy_images,
+        "inline_max_bytes": args.inline_max_kb * 1024,
+        "hybrid": args.hybrid,
+        "image_format": args.image_format,
+        "image_quality": args.image_quality,
+        "image_max_size": args.image_max_size,
+    }
+
+
+@contextmanager
+def pipeline_resources(args, api_key):
+    """按命令行参数配置限流和指标输出，产出 (backend, cache, index)，结束时统一关闭"""
+    # 所选模型的OCR请求和文件相关请求各用一个限流器，参数相同；
+    # 突发量随速率设置，调低 --rate-limit 时启动阶段也不会一次发出过多请求
+    burst = args.burst if args.burst is not None else max(1, int(args.rate_limit))
+    for key in (args.model, FILES_KEY):
+        configure_rate_limit(key, rate=args.rate_limit, burst=burst, max_in_flight=args.max_in_flight)
+
+    metrics = get_metrics()
+    if args.metrics_log:
+        metrics.open_log(args.metrics_log)
+    metrics_server = metrics.serve_prometheus(args.metrics_port) if args.metrics_port else None
+
+    backend = get_backend(api_key, args.server_url)
+    cache = None if args.no_cache else OcrCache(args.cache_dir, args.cache_max_mb * 1024 * 1024)
+    index = None if args.no_index else SearchIndex(args.index)
+    try:
+        yield backend, cache, index
+    finally:
+        if cache is not None:
+            cache.close()
+        if index is not None:
+            index.close()
+        close_backends()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        metrics.close()
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    api_key = resolve_api_key(args)
+    if not api_key:
+        print("错误: 请提供Mistral API Key", file=sys.stderr)
+        return 2
+
+    input_dir = Path(args.input_dir).resolve()
+    if not input_dir.is_dir():
+        print(f"错误: 输入目录不存在: {input_dir}", file=sys.stderr)
+        return 2
+
+    output_root = Path(args.output) if args.output else input_dir.with_name(f"{input_dir.name}_ocr")
+    error = pipeline_argument_error(args)
+    if error:
+        print(f"错误: {error}", file=sys.stderr)
+        return 2
+
+    with pipeline_resources(args, api_key) as (backend, cache, index):
+        _, failed = run_batch(
+            input_dir, output_root, backend, args.model, args.format, args.concurrency, cache,
+            restart=args.restart, metrics_file=args.metrics_file, index=index, **pipeline_options(args),
+        )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+import os
+import io
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from ocr_result import json_default
+
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "MISTRAL_OCR_CACHE_DIR",
+    os.path.join(Path.home(), ".cache", "mistral_ocr"),
+)
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024  # 512 MB
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(file_path):
+    """分块计算文件的SHA-256，避免把整个PDF读入内存"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class HashingReader(io.BufferedReader):
+    """以流的方式读取文件，并在读取（上传）的同时计算SHA-256
+
+    上传时不必先把整个PDF读入内存，也不需要为计算哈希再读一遍磁盘。
+    只有从头到尾顺序读完后 hexdigest() 才是整个文件的哈希；
+    HTTP客户端重试时会 seek(0)，此时哈希状态随之重置。
+    """
+
+    def __init__(self, file_path, buffer_size=HASH_CHUNK_SIZE):
+        super().__init__(io.FileIO(file_path, "rb"), buffer_size)
+        self._digest = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self._digest.update(data)
+        return data
+
+    def read1(self, size=-1):
+        data = super().read1(size)
+        self._digest.update(data)
+        return data
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        position = super().seek(offset, whence)
+        if position == 0:
+            self._digest = hashlib.sha256()
+        return position
+
+    def hexdigest(self):
+        return self._digest.hexdigest()
+
+
+# 分页缓存表的键列，淘汰时两张表一起按LRU处理
+_CACHE_TABLE_KEYS = {"ocr_results": "sha256", "page_results": "page_hash"}
+
+# 单条SQL中 IN (...) 参数的数量上限
+_SQL_BATCH_SIZE = 500
+
+
+class OcrCache:
+    """以 (PDF内容SHA-256, 模型) 为键的持久化OCR结果缓存
+
+    另有以 (单页内容哈希, 模型) 为键的分页结果，文档修订后未变化的页可直接复用。
+    结果存放在SQLite中，总大小超过 max_bytes 时按最近使用时间(LRU)淘汰。
+    同一个实例可被多个线程共享。
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, "ocr_cache.sqlite3")
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS ocr_results (
+                sha256 TEXT NOT NULL,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (sha256, model)
+            )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS page_results (
+                page_hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                page TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (page_hash, model)
+            )"""
+        )
+        self._conn.commit()
+
+    def get(self, sha256, model):
+        """返回缓存的 response_dict，未命中时返回 None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM ocr_results WHERE sha256 = ? AND model = ?",
+                (sha256, model),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE ocr_results SET last_used = ? WHERE sha256 = ? AND model = ?",
+                (time.time(), sha256, model),
+            )
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, sha256, model, response_dict, page_hashes=None):
+        """写入一条结果，并在超出容量时淘汰最久未使用的条目
+
+        传入 page_hashes（{页码: 页面内容哈希}）时，这些页同时写入分页结果。
+        每页只序列化一次，整份结果的JSON由各页的JSON拼接而成。
+        """
+        page_hashes = page_hashes or {}
+        now = time.time()
+        page_jsons = []
+        page_rows = []
+        for page in response_dict.get("pages", []):
+            page_json = json.dumps(page, ensure_ascii=False, default=json_default)
+            page_jsons.append(page_json)
+            if page.get("index") in page_hashes:
+                page_rows.append((page_hashes[page["index"]], model, page_json,
+                                  len(page_json.encode("utf-8")), now))
+        rest = json.dumps({key: value for key, value in response_dict.items() if key != "pages"},
+                          ensure_ascii=False, default=json_default)
+        response = '{"pages": [' + ", ".join(page_jsons) + "]" + (", " + rest[1:] if rest != "{}" else "}")
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            if size <= self.max_bytes:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO ocr_results (sha256, model, response, size, last_used) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (sha256, model, response, size, now),
+                )
+            self._put_page_rows(page_rows)
+            self._evict()
+            self._conn.commit()
+
+    def get_pages(self, page_hashes, model):
+        """批量查询分页结果，返回 {页面哈希: 页面}，只包含命中的页"""
+        page_hashes = list(dict.fromkeys(page_hashes))
+        found = {}
+        with self._lock:
+            for start in range(0, len(page_hashes), _SQL_BATCH_SIZE):
+                batch = page_hashes[start:start + _SQL_BATCH_SIZE]
+                placeholders = ", ".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT page_hash, page FROM page_results WHERE model = ? AND page_hash IN ({placeholders})",
+                    (model, *batch),
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE page_results SET last_used = ? WHERE page_hash = ? AND model = ?",
+                    [(now, page_hash, model) for page_hash in found],
+                )
+                self._conn.commit()
+        return {page_hash: json.loads(page) for page_hash, page in found.items()}
+
+    def put_pages(self, pages_by_hash, model):
+        """写入分页结果 {页面哈希: 页面}"""
+        now = time.time()
+        rows = []
+        for page_hash, page in pages_by_hash.items():
+            page_json = json.dumps(page, ensure_ascii=False, default=json_default)
+            rows.append((page_hash, model, page_json, len(page_json.encode("utf-8")), now))
+        if not rows:
+            return
+        with self._lock:
+            self._put_page_rows(rows)
+            self._evict()
+            self._conn.commit()
+
+    def _put_page_rows(self, rows):
+        # 调用方已持有锁
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO page_results (page_hash, model, page, size, last_used) "
+            "VALUES (?, ?, ?, ?, ?)",
+            rows,
+        )
+
+    def _evict(self):
+        total = self._conn.execute(
+            "SELECT (SELECT COALESCE(SUM(size), 0) FROM ocr_results) "
+            "+ (SELECT COALESCE(SUM(size), 0) FROM page_results)"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute(
+            "SELECT 'ocr_results', sha256, model, size, last_used FROM ocr_results "
+            "UNION ALL SELECT 'page_results', page_hash, model, size, last_used FROM page_results "
+            "ORDER BY last_used ASC"
+        ).fetchall()
+        for table, key, model, size, _ in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute(
+                f"DELETE FROM {table} WHERE {_CACHE_TABLE_KEYS[table]} = ? AND model = ?", (key, model)
+            )
+            total -= size
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM ocr_results")
+            self._conn.execute("DELETE FROM page_results")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    """返回进程内共享的默认缓存实例"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = OcrCache()
+        return _default_cache
@@ -0,0 +1,117 @@
+import os
+import hashlib
+from ocr_result import OcrPage
+# PyMuPDF（fitz）导入较慢，在各函数首次使用时才导入
+
+
+def page_ranges(page_count, chunk_pages):
+    """把 [0, page_count) 按 chunk_pages 页一组切分为 (起始页, 结束页) 列表，结束页不含"""
+    return [
+        (start, min(start + chunk_pages, page_count))
+        for start in range(0, page_count, chunk_pages)
+    ]
+
+
+def pdf_page_count(pdf_path):
+    import fitz
+    with fitz.open(pdf_path) as pdf_document:
+        return len(pdf_document)
+
+
+def split_pdf(pdf_path, ranges, output_folder):
+    """按页码范围把PDF拆分为多个小PDF文件，返回与 ranges 一一对应的文件路径"""
+    import fitz
+    os.makedirs(output_folder, exist_ok=True)
+    chunk_paths = []
+    with fitz.open(pdf_path) as pdf_document:
+        for start, end in ranges:
+            chunk_path = os.path.join(output_folder, f"pages_{start+1}-{end}.pdf")
+            with fitz.open() as chunk_document:
+                chunk_document.insert_pdf(pdf_document, from_page=start, to_page=end - 1)
+                chunk_document.save(chunk_path)
+            chunk_paths.append(chunk_path)
+    return chunk_paths
+
+
+def merge_chunk_responses(chunk_responses, ranges):
+    """把各分块的OCR结果按原始顺序拼接成一个完整结果
+
+    每个分块的页码从0开始，这里按分块的起始页修正 index，
+    使合并结果与整份文档一次性OCR的结构一致。
+    """
+    merged = None
+    for response_dict, (start, _) in zip(chunk_responses, ranges):
+        if merged is None:
+            merged = {key: value for key, value in response_dict.items() if key != "pages"}
+            merged["pages"] = []
+            merged["usage_info"] = dict(response_dict.get("usage_info") or {})
+        else:
+            # 累加用量统计（页数、文档大小等）
+            for key, value in (response_dict.get("usage_info") or {}).items():
+                if isinstance(value, (int, float)) and isinstance(merged["usage_info"].get(key), (int, float)):
+                    merged["usage_info"][key] += value
+
+        for page in response_dict.get("pages", []):
+            # 修正页码时生成新的 OcrPage 记录，markdown 和图片不复制
+            merged["pages"].append(OcrPage.from_dict(page).with_index(start + page.get("index", 0)))
+
+    return merged or {"pages": []}
+
+
+def extract_pages(pdf_path, page_indexes, output_path):
+    """把指定页（可以不连续）复制为一个新的PDF文件"""
+    import fitz
+    with fitz.open(pdf_path) as pdf_document, fitz.open() as subset_document:
+        for page_index in page_indexes:
+            subset_document.insert_pdf(pdf_document, from_page=page_index, to_page=page_index)
+        subset_document.save(output_path)
+    return output_path
+
+
+def pdf_page_hashes(pdf_path, page_indexes=None):
+    """计算每页的内容哈希，返回 {页码: 哈希}
+
+    哈希覆盖页面尺寸和旋转、内容流、引用的图片和表单XObject数据以及字体名称，
+    只取决于该页本身，文档其他页的修改不会影响它。
+    """
+    import fitz
+    hashes = {}
+    with fitz.open(pdf_path) as pdf_document:
+        if page_indexes is None:
+            page_indexes = range(len(pdf_document))
+        for page_index in page_indexes:
+            page = pdf_document[page_index]
+            digest = hashlib.sha256()
+            digest.update(f"{tuple(page.rect)}:{page.rotation}".encode("utf-8"))
+            digest.update(page.read_contents())
+            for xref in [img[0] for img in page.get_images(full=True)] + [xobj[0] for xobj in page.get_xobjects()]:
+                digest.update(pdf_document.xref_stream_raw(xref) or b"")
+            for font in page.get_fonts(full=True):
+                digest.update(f"{font[3]}:{font[1]}".encode("utf-8"))
+            hashes[page_index] = digest.hexdigest()
+    return hashes
+
+
+def merge_page_results(known_pages, ocr_indexes, ocr_response, model, file_path):
+    """把已有的页面（文字层提取或缓存复用）与新OCR的页按原页码顺序合并
+
+    ocr_response 为只包含 ocr_indexes 这些页的PDF的OCR结果（没有需要OCR的页时为 None），
+    其第 i 页对应原文档的 ocr_indexes[i]。用量统计只计入实际OCR的页。
+    """
+    if ocr_response is None:
+        merged = {
+            "model": model,
+            "usage_info": {"pages_processed": 0, "doc_size_bytes": os.path.getsize(file_path)},
+            "document_annotation": None,
+        }
+        ocr_pages = []
+    else:
+        merged = {key: value for key, value in ocr_response.items() if key != "pages"}
+        ocr_pages = ocr_response.get("pages", [])
+
+    pages = dict(known_pages)
+    for position, page in enumerate(ocr_pages):
+        if position < len(ocr_indexes):
+            pages[ocr_indexes[position]] = OcrPage.from_dict(page).with_index(ocr_indexes[position])
+    merged["pages"] = [pages[page_index] for page_index in sorted(pages)]
+    return merged
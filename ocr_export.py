@@ -0,0 +1,327 @@
+import os
+import re
+import sys
+import json
+import shutil
+import textwrap
+import hashlib
+import time
+import threading
+from collections import OrderedDict
+from ocr_metrics import get_metrics
+
+
+# 输出格式对应的文件扩展名
+FILE_EXTENSIONS = {
+    "markdown": "md",  # 对markdown使用.md扩展名
+    "html": "html",
+    "json": "json",
+    "jsonl": "jsonl",  # 每行一页，适合超大文档的流式处理
+}
+
+MARKDOWN_FOOTER = "\n\n---\n\n*Generated by Mistral OCR App | by Lei Da (David) | greatradar@gmail.com*"
+
+# HTML以页眉 + 逐页内容 + 页脚的方式流式写出
+HTML_HEADER = """<!DOCTYPE html>
+            <html>
+            <head>
+                <meta charset="UTF-8">
+                <meta name="viewport" content="width=device-width, initial-scale=1.0">
+                <title>OCR Result</title>
+                <style>
+                    body {
+                        font-family: Arial, sans-serif;
+                        line-height: 1.6;
+                        margin: 0 auto;
+                        max-width: 800px;
+                        padding: 20px;
+                    }
+                    img { max-width: 100%; height: auto; }
+                    h1, h2, h3 { margin-top: 1.5em; }
+                    p { margin: 1em 0; }
+                </style>
+            </head>
+            <body>
+"""
+
+HTML_FOOTER = """
+            <hr>
+            <p style="text-align: right; color: #666; font-size: 0.8em;">
+                Generated by Mistral OCR App | by Lei Da (David) | greatradar@gmail.com
+            </p>
+            </body>
+            </html>"""
+
+
+# markdown图片引用 ![说明](图片ID)，一次扫描即可配合查找表完成所有替换
+IMAGE_REF_PATTERN = re.compile(r"!\[(.*?)\]\(([^)]*)\)")
+
+
+JSON_METADATA = {
+    "app": "Mistral OCR App",
+    "author": "Lei Da (David)",
+    "contact": "greatradar@gmail.com"
+}
+
+# Linux 上的 FICLONE ioctl，用于在支持的文件系统(btrfs/xfs)上做写时复制克隆
+_FICLONE = 0x40049409
+
+
+def _no_progress(message):
+    pass
+
+
+def _reflink(src_path, dest_path):
+    """尝试写时复制克隆文件，不支持时抛出 OSError"""
+    if not sys.platform.startswith("linux"):
+        raise OSError("reflink not supported")
+    import fcntl
+    with open(src_path, "rb") as src_file, open(dest_path, "wb") as dest_file:
+        try:
+            fcntl.ioctl(dest_file.fileno(), _FICLONE, src_file.fileno())
+        except OSError:
+            dest_file.close()
+            os.remove(dest_path)
+            raise
+
+
+def place_image(src_path, dest_path, move=False, link=True):
+    """把提取的图片放到输出目录，尽量只做元数据操作
+
+    move=True 时直接移动（同一文件系统下为重命名）；否则依次尝试硬链接、
+    写时复制克隆，都不可用（如跨文件系统）时才真正复制数据。
+    源文件会被复用（如共享缓存）时传入 link=False，目标不能与它是同一个文件。
+    """
+    if os.path.exists(dest_path):
+        # 之前中断的运行可能已经把图片移动过去了
+        if not os.path.exists(src_path) or os.path.samefile(src_path, dest_path):
+            return
+        os.remove(dest_path)
+
+    if move:
+        shutil.move(src_path, dest_path)
+        return
+    if link:
+        try:
+            os.link(src_path, dest_path)
+            return
+        except OSError:
+            pass
+    try:
+        _reflink(src_path, dest_path)
+        return
+    except OSError:
+        pass
+    shutil.copy2(src_path, dest_path)
+
+
+def build_image_index(extracted_images):
+    """按页码建立提取图片的索引 {页码: [图片信息, ...]}，保持原有顺序"""
+    image_index = {}
+    for img_info in extracted_images:
+        image_index.setdefault(img_info["page"], []).append(img_info)
+    return image_index
+
+
+def page_image_targets(page, page_images):
+    """把页内OCR图片与同页提取的图片按顺序配对，返回 {图片ID: 图片信息}"""
+    targets = {}
+    for img_idx, img in enumerate(page.get("images", [])):
+        if "id" in img and img_idx < len(page_images):
+            targets[img["id"]] = page_images[img_idx]
+    return targets
+
+
+def rewrite_image_refs(markdown_text, replacements):
+    """一次扫描替换markdown中的图片引用，replacements 为 {图片ID: 新地址}"""
+    if not replacements:
+        return markdown_text
+
+    def _replace(match):
+        target = replacements.get(match.group(2))
+        if target is None:
+            return match.group(0)
+        return f"![{match.group(1)}]({target})"
+
+    return IMAGE_REF_PATTERN.sub(_replace, markdown_text)
+
+
+class PageHtmlCache:
+    """按 (页面markdown哈希, 图片映射) 缓存单页转换后的HTML
+
+    预览、HTML导出和重复保存共用同一份缓存，切换格式或再次保存时
+    只需转换内容发生变化的页。可在多个线程中同时使用。
+    """
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _markdown(self):
+        # markdown.Markdown 实例不是线程安全的，每个线程各用一个
+        md = getattr(self._local, "md", None)
+        if md is None:
+            # markdown 库只有渲染HTML时才需要，首次使用时才导入
+            import markdown
+            md = self._local.md = markdown.Markdown(extensions=["tables"])
+        return md
+
+    def render(self, markdown_text, replacements):
+        """替换图片引用并把单页markdown转换为HTML，命中缓存时直接返回"""
+        key = (
+            hashlib.sha1(markdown_text.encode("utf-8")).hexdigest(),
+            tuple(sorted(replacements.items())),
+        )
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                return html
+
+        md = self._markdown()
+        html = md.reset().convert(rewrite_image_refs(markdown_text, replacements))
+
+        with self._lock:
+            self._entries[key] = html
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return html
+
+
+_page_html_cache = PageHtmlCache()
+
+
+def get_page_html_cache():
+    """返回进程内共享的单页HTML缓存"""
+    return _page_html_cache
+
+
+def _page_with_local_paths(page, page_images):
+    """返回附带 local_path 的页面副本（普通dict，可直接序列化），不修改原始结果"""
+    page = dict(page)
+    images = []
+    for img_idx, img in enumerate(page.get("images", [])):
+        img = dict(img)
+        if img_idx < len(page_images):
+            img["local_path"] = f"images/{page_images[img_idx]['filename']}"
+        images.append(img)
+    page["images"] = images
+    return page
+
+
+def _write_markdown(f, pages, page_replacements):
+    # 图片引用替换的耗时逐页累计，写完后作为一个阶段记录
+    rewrite_seconds = 0.0
+    for page_idx, (page, replacements) in enumerate(zip(pages, page_replacements)):
+        if page_idx:
+            f.write("\n\n")
+        start = time.perf_counter()
+        page_markdown = rewrite_image_refs(page.get("markdown", ""), replacements)
+        rewrite_seconds += time.perf_counter() - start
+        f.write(page_markdown)
+    # 在markdown文件末尾添加作者信息
+    f.write(MARKDOWN_FOOTER)
+    get_metrics().record("rewrite", rewrite_seconds, pages=len(pages))
+
+
+def _write_html(f, pages, page_replacements):
+    # 逐页转换为HTML，未变化的页直接复用缓存
+    html_cache = get_page_html_cache()
+    render_seconds = 0.0
+    f.write(HTML_HEADER)
+    for page, replacements in zip(pages, page_replacements):
+        start = time.perf_counter()
+        page_html = html_cache.render(page.get("markdown", ""), replacements)
+        render_seconds += time.perf_counter() - start
+        f.write(page_html)
+        f.write("\n")
+    f.write(HTML_FOOTER)
+    # render 包含图片引用替换和markdown转换
+    get_metrics().record("render", render_seconds, pages=len(pages))
+
+
+def _write_json(f, response_data, pages, image_index):
+    # 与 json.dump(indent=4) 的结构相同，但页面逐个序列化写出
+    f.write('{\n    "pages": [')
+    for page_idx, page in enumerate(pages):
+        page_json = json.dumps(_page_with_local_paths(page, image_index.get(page_idx, [])),
+                               indent=4, ensure_ascii=False)
+        f.write(("," if page_idx else "") + "\n" + textwrap.indent(page_json, " " * 8))
+    f.write("\n    ]" if pages else "]")
+
+    # 其余字段（模型、用量等）和包含作者信息的元数据
+    for key, value in response_data.items():
+        if key in ("pages", "metadata"):
+            continue
+        value_json = json.dumps(value, indent=4, ensure_ascii=False).replace("\n", "\n    ")
+        f.write(f",\n    {json.dumps(key)}: {value_json}")
+    metadata_json = json.dumps(JSON_METADATA, indent=4, ensure_ascii=False).replace("\n", "\n    ")
+    f.write(f',\n    "metadata": {metadata_json}\n}}')
+
+
+def _write_jsonl(f, pages, image_index):
+    for page_idx, page in enumerate(pages):
+        f.write(json.dumps(_page_with_local_paths(page, image_index.get(page_idx, [])), ensure_ascii=False))
+        f.write("\n")
+
+
+def save_ocr_result(response_data, extracted_images, output_dir, output_format, progress=None,
+                    image_index=None, move_images=False):
+    """将OCR结果和提取的图片保存到 output_dir，返回输出文件路径
+
+    目录布局为 ocr_result.{md,html,json,jsonl} + images/，GUI保存和批处理模式共用。
+    内容逐页处理并写出，不在内存中拼接整份文档；图片通过硬链接/克隆放入输出目录，
+    move_images=True 时直接移动（适合之后就会删除的临时文件夹）。
+    image_index 为 build_image_index 的结果，调用方已建立时可直接传入复用。
+    """
+    progress = progress or _no_progress
+    if image_index is None:
+        image_index = build_image_index(extracted_images)
+
+    # 创建图片文件夹
+    images_folder = os.path.join(output_dir, "images")
+    os.makedirs(images_folder, exist_ok=True)
+
+    # 把已提取的图片放入目标文件夹（重复引用的同一张图片只处理一次）
+    placed = set()
+    with get_metrics().stage("place_images") as stage:
+        for img_info in extracted_images:
+            if img_info["filename"] in placed:
+                continue
+            placed.add(img_info["filename"])
+            try:
+                dest_path = os.path.join(images_folder, img_info["filename"])
+                place_image(img_info["path"], dest_path, move=move_images)
+            except Exception as e:
+                stage.status = "error"
+                progress(f"复制图片时出错: {str(e)}")
+
+    # 确定正确的文件扩展名
+    file_ext = FILE_EXTENSIONS.get(output_format, output_format)
+    output_file = os.path.join(output_dir, f"ocr_result.{file_ext}")
+
+    pages = response_data.get("pages", [])
+    # 每页的图片ID → 保存后的相对路径（按需逐页生成）
+    page_replacements = (
+        {
+            img_id: f"images/{img_info['filename']}"
+            for img_id, img_info in page_image_targets(page, image_index.get(page_idx, [])).items()
+        }
+        for page_idx, page in enumerate(pages)
+    )
+
+    with get_metrics().stage("write", pages=len(pages)) as stage:
+        with open(output_file, 'w', encoding='utf-8') as f:
+            if output_format == "html":
+                _write_html(f, pages, page_replacements)
+            elif output_format == "json":
+                _write_json(f, response_data, pages, image_index)
+            elif output_format == "jsonl":
+                _write_jsonl(f, pages, image_index)
+            else:  # markdown
+                _write_markdown(f, pages, page_replacements)
+        stage.bytes = os.path.getsize(output_file)
+
+    return output_file
@@ -0,0 +1,582 @@
+import os
+import sys
+import json
+from pathlib import Path
+from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
+                             QPushButton, QLabel, QFileDialog, QTextEdit, QComboBox, 
+                             QGroupBox, QLineEdit, QProgressBar, QMessageBox,
+                             QStatusBar, QTabWidget, QSplitter, QCheckBox,
+                             QSpinBox, QListWidget, QListWidgetItem)
+from PyQt6.QtCore import Qt, QThread, pyqtSignal, QSize, QUrl
+from PyQt6.QtGui import QIcon, QPixmap, QFont, QDesktopServices
+import uuid
+import shutil
+import tempfile
+from ocr_pipeline import run_ocr
+from ocr_export import (save_ocr_result, build_image_index, page_image_targets, rewrite_image_refs,
+                        get_page_html_cache)
+from ocr_cache import get_default_cache
+from ocr_index import get_default_index
+from ocr_images import transcode_images, make_thumbnails, image_format_error
+from ocr_backend import get_backend, close_backends
+from ocr_metrics import get_metrics
+from ocr_result import OcrResult, json_default
+
+class OcrWorker(QThread):
+    progress_updated = pyqtSignal(str)
+    # object 类型的信号按引用传递；声明为 dict/list 时会在线程间整体转换、复制一遍
+    finished = pyqtSignal(object, object)
+    error = pyqtSignal(str)
+    
+    def __init__(self, file_path, api_key, model, use_cache=True, chunk_pages=0, hybrid=False,
+                 image_format="original", image_max_size=0):
+        super().__init__()
+        self.file_path = file_path
+        self.api_key = api_key
+        self.model = model
+        self.use_cache = use_cache
+        self.chunk_pages = chunk_pages
+        self.hybrid = hybrid
+        self.image_format = image_format
+        self.image_max_size = image_max_size
+        self.temp_image_folder = None
+        self.thumbnail_folder = None
+    
+    def run(self):
+        try:
+            # 同一个API Key的所有任务复用同一个客户端和长连接
+            backend = get_backend(self.api_key)
+            
+            # 创建临时图片文件夹
+            self.temp_image_folder = os.path.join(os.path.dirname(self.file_path), f"temp_images_{uuid.uuid4().hex}")
+            os.makedirs(self.temp_image_folder, exist_ok=True)
+            
+            metrics = get_metrics()
+            with metrics.document(self.file_path), metrics.stage("document") as stage:
+                response_dict, extracted_images = run_ocr(
+                    backend, self.file_path, self.model, self.temp_image_folder,
+                    progress=self.progress_updated.emit,
+                    cache=get_default_cache() if self.use_cache else None,
+                    chunk_pages=self.chunk_pages,
+                    hybrid=self.hybrid,
+                )
+                stage.pages = len(response_dict.get("pages", []))
+                if extracted_images:
+                    self.progress_updated.emit("正在处理图片...")
+                extracted_images = transcode_images(
+                    extracted_images, os.path.join(self.temp_image_folder, "converted"),
+                    self.image_format, max_size=self.image_max_size,
+                )
+                # 预览使用缩略图，不必加载原尺寸的扫描图片；缩略图文件夹在保存后仍保留
+                self.thumbnail_folder = tempfile.mkdtemp(prefix="ocr_thumbnails_")
+                make_thumbnails(extracted_images, self.thumbnail_folder)
+            # 转换为紧凑的页面记录后，原始的嵌套dict即可释放
+            self.finished.emit(OcrResult.from_dict(response_dict), extracted_images)
+        
+        except Exception as e:
+            # 处理失败时结果不会被保存，直接清理临时图片文件夹
+            if self.temp_image_folder:
+                shutil.rmtree(self.temp_image_folder, ignore_errors=True)
+            if self.thumbnail_folder:
+                shutil.rmtree(self.thumbnail_folder, ignore_errors=True)
+            self.error.emit(str(e))
+
+
+PREVIEW_PAGES_PER_VIEW = 5
+
+PREVIEW_HTML_TEMPLATE = """<!DOCTYPE html>
+                <html>
+                <head>
+                    <meta charset="UTF-8">
+                    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+                    <title>OCR Result</title>
+                    <style>
+                        body {{ 
+                            font-family: Arial, sans-serif;
+                            line-height: 1.6;
+                            margin: 0 auto;
+                            max-width: 800px;
+                            padding: 20px;
+                        }}
+                        img {{ max-width: 100%; height: auto; }}
+                        h1, h2, h3 {{ margin-top: 1.5em; }}
+                        p {{ margin: 1em 0; }}
+                    </style>
+                </head>
+                <body>
+                {html_content}
+                </body>
+                </html>"""
+
+
+def render_preview_pages(pages, first_page_idx, image_index, output_format):
+    """把一组页面渲染为预览内容，返回 (内容, 是否为HTML)
+
+    图片以本地文件URL引用（有缩略图时使用缩略图），由 QTextDocument 按需加载，不再把图片base64内联进文档。
+    """
+    if output_format == "json":
+        return json.dumps(pages, indent=4, ensure_ascii=False, default=json_default), False
+    if output_format == "jsonl":
+        return "\n".join(json.dumps(page, ensure_ascii=False, default=json_default) for page in pages), False
+    
+    page_replacements = []
+    for offset, page in enumerate(pages):
+        targets = page_image_targets(page, image_index.get(first_page_idx + offset, []))
+        page_replacements.append({
+            image_id: QUrl.fromLocalFile(img_info.get("thumbnail") or img_info["path"]).toString()
+            for image_id, img_info in targets.items()
+        })
+    
+    if output_format == "html":
+        # 逐页转换，翻页回来或切换格式时已转换过的页直接复用
+        html_cache = get_page_html_cache()
+        html_content = "\n".join(
+            html_cache.render(page.get("markdown", ""), replacements)
+            for page, replacements in zip(pages, page_replacements)
+        )
+        return PREVIEW_HTML_TEMPLATE.format(html_content=html_content), True
+    
+    # 替换markdown中的图片引用
+    markdown_text = "\n\n".join(
+        rewrite_image_refs(page.get("markdown", ""), replacements)
+        for page, replacements in zip(pages, page_replacements)
+    )
+    return markdown_text, False
+
+
+class PreviewRenderer(QThread):
+    """在后台线程中完成markdown → HTML转换，避免大文档阻塞界面"""
+    rendered = pyqtSignal(int, str, bool)
+    
+    def __init__(self, request_id, pages, first_page_idx, image_index, output_format):
+        super().__init__()
+        self.request_id = request_id
+        self.pages = pages
+        self.first_page_idx = first_page_idx
+        self.image_index = image_index
+        self.output_format = output_format
+    
+    def run(self):
+        content, is_html = render_preview_pages(
+            self.pages, self.first_page_idx, self.image_index, self.output_format
+        )
+        self.rendered.emit(self.request_id, content, is_html)
+
+
+class MistralOcrApp(QMainWindow):
+    def __init__(self):
+        super().__init__()
+        self.preview_first_page = 0
+        self.preview_request_id = 0
+        self.preview_renderers = set()
+        self.raw_text_loaded = False
+        self.initUI()
+        self.response_data = None
+        self.extracted_images = None
+        self.image_index = {}
+        self.output_folder = None
+        self.thumbnail_folder = None
+        
+    def initUI(self):
+        self.setWindowTitle("Mistral OCR")
+        self.setMinimumSize(800, 600)
+        
+        # Main widget and layout
+        main_widget = QWidget()
+        main_layout = QVBoxLayout(main_widget)
+        
+        # API Key section
+        api_key_group = QGroupBox("API 设置")
+        api_key_layout = QHBoxLayout()
+        self.api_key_input = QLineEdit()
+        self.api_key_input.setPlaceholderText("输入Mistral API Key或使用环境变量MISTRAL_API_KEY")
+        self.api_key_input.setText(os.environ.get("MISTRAL_API_KEY", ""))
+        self.api_key_input.setEchoMode(QLineEdit.EchoMode.Password)
+        api_key_layout.addWidget(QLabel("API Key:"))
+        api_key_layout.addWidget(self.api_key_input)
+        api_key_group.setLayout(api_key_layout)
+        main_layout.addWidget(api_key_group)
+        
+        # File selection
+        file_group = QGroupBox("文件选择")
+        file_layout = QHBoxLayout()
+        self.file_path_label = QLabel("未选择文件")
+        self.file_path_label.setWordWrap(True)
+        select_file_btn = QPushButton("选择PDF或图片")
+        select_file_btn.clicked.connect(self.select_file)
+        file_layout.addWidget(self.file_path_label)
+        file_layout.addWidget(select_file_btn)
+        file_group.setLayout(file_layout)
+        main_layout.addWidget(file_group)
+        
+        # Options
+        options_group = QGroupBox("OCR 选项")
+        options_layout = QVBoxLayout()
+        
+        model_layout = QHBoxLayout()
+        model_layout.addWidget(QLabel("OCR 模型:"))
+        self.model_combo = QComboBox()
+        self.model_combo.addItem("mistral-ocr-latest", "mistral-ocr-latest")
+        model_layout.addWidget(self.model_combo)
+        options_layout.addLayout(model_layout)
+        
+        # Output format options
+        format_layout = QHBoxLayout()
+        format_layout.addWidget(QLabel("输出格式:"))
+        self.format_combo = QComboBox()
+        self.format_combo.addItems(["Markdown", "HTML", "JSON", "JSONL"])
+        self.format_combo.currentIndexChanged.connect(self.refresh_preview)
+        format_layout.addWidget(self.format_combo)
+        options_layout.addLayout(format_layout)
+        
+        # 大文档按页拆分后并发OCR
+        chunk_layout = QHBoxLayout()
+        chunk_layout.addWidget(QLabel("分块页数:"))
+        self.chunk_spin = QSpinBox()
+        self.chunk_spin.setRange(0, 1000)
+        self.chunk_spin.setSpecialValueText("不分块")
+        self.chunk_spin.setToolTip("大于0时按该页数拆分PDF并发OCR，适合数百页的大文档")
+        chunk_layout.addWidget(self.chunk_spin)
+        options_layout.addLayout(chunk_layout)
+        
+        # 相同PDF和模型直接复用缓存结果，不再调用API
+        self.cache_checkbox = QCheckBox("使用缓存结果（相同文件和模型不重复调用API）")
+        self.cache_checkbox.setChecked(True)
+        options_layout.addWidget(self.cache_checkbox)
+        
+        # 电子版PDF的文字页直接读取文字层，只把扫描页发送OCR
+        self.hybrid_checkbox = QCheckBox("混合模式（带文字层的页本地提取，只OCR扫描页）")
+        options_layout.addWidget(self.hybrid_checkbox)
+        
+        # 扫描件中的大图可转换格式并缩小，减小输出文件夹
+        image_layout = QHBoxLayout()
+        image_layout.addWidget(QLabel("图片格式:"))
+        self.image_format_combo = QComboBox()
+        for label, image_format in (("保持原样", "original"), ("JPEG", "jpeg"), ("PNG", "png"), ("WebP", "webp")):
+            self.image_format_combo.addItem(label, image_format)
+        image_layout.addWidget(self.image_format_combo)
+        image_layout.addWidget(QLabel("最长边:"))
+        self.image_size_spin = QSpinBox()
+        self.image_size_spin.setRange(0, 20000)
+        self.image_size_spin.setSingleStep(256)
+        self.image_size_spin.setSpecialValueText("不缩小")
+        self.image_size_spin.setSuffix(" 像素")
+        image_layout.addWidget(self.image_size_spin)
+        options_layout.addLayout(image_layout)
+        
+        options_group.setLayout(options_layout)
+        main_layout.addWidget(options_group)
+        
+        # Process button and progress
+        process_layout = QHBoxLayout()
+        self.process_btn = QPushButton("处理文档")
+        self.process_btn.clicked.connect(self.process_document)
+        self.process_btn.setEnabled(False)
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 0)  # Indeterminate
+        self.progress_bar.setVisible(False)
+        process_layout.addWidget(self.process_btn)
+        process_layout.addWidget(self.progress_bar)
+        main_layout.addLayout(process_layout)
+        
+        # Save options
+        save_group = QGroupBox("保存选项")
+        save_layout = QHBoxLayout()
+        self.save_btn = QPushButton("保存结果")
+        self.save_btn.clicked.connect(self.save_result)
+        self.save_btn.setEnabled(False)
+        save_layout.addWidget(self.save_btn)
+        save_group.setLayout(save_layout)
+        main_layout.addWidget(save_group)
+        
+        # Results area with tabs for preview and raw data
+        results_tabs = QTabWidget()
+        
+        # Preview tab: 分页预览，每次只渲染几页
+        preview_widget = QWidget()
+        preview_layout = QVBoxLayout(preview_widget)
+        preview_layout.setContentsMargins(0, 0, 0, 0)
+        page_nav_layout = QHBoxLayout()
+        self.prev_page_btn = QPushButton("上一页")
+        self.prev_page_btn.clicked.connect(self.show_previous_pages)
+        self.prev_page_btn.setEnabled(False)
+        self.next_page_btn = QPushButton("下一页")
+        self.next_page_btn.clicked.connect(self.show_next_pages)
+        self.next_page_btn.setEnabled(False)
+        self.preview_page_label = QLabel("")
+        self.preview_page_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        page_nav_layout.addWidget(self.prev_page_btn)
+        page_nav_layout.addWidget(self.preview_page_label, 1)
+        page_nav_layout.addWidget(self.next_page_btn)
+        preview_layout.addLayout(page_nav_layout)
+        self.preview_text = QTextEdit()
+        self.preview_text.setReadOnly(True)
+        preview_layout.addWidget(self.preview_text)
+        results_tabs.addTab(preview_widget, "预览")
+        
+        # Raw tab
+        self.raw_text = QTextEdit()
+        self.raw_text.setReadOnly(True)
+        self.raw_text.setFont(QFont("Courier New", 10))
+        results_tabs.addTab(self.raw_text, "原始数据")
+        
+        # Search tab: 在所有已保存的结果中全文检索
+        search_widget = QWidget()
+        search_layout = QVBoxLayout(search_widget)
+        search_layout.setContentsMargins(0, 0, 0, 0)
+        search_input_layout = QHBoxLayout()
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("输入检索词，多个词以空格分隔")
+        self.search_input.returnPressed.connect(self.run_search)
+        search_btn = QPushButton("搜索")
+        search_btn.clicked.connect(self.run_search)
+        search_input_layout.addWidget(self.search_input)
+        search_input_layout.addWidget(search_btn)
+        search_layout.addLayout(search_input_layout)
+        self.search_results = QListWidget()
+        self.search_results.setWordWrap(True)
+        self.search_results.itemActivated.connect(self.open_search_hit)
+        search_layout.addWidget(self.search_results)
+        results_tabs.addTab(search_widget, "搜索")
+        results_tabs.currentChanged.connect(self.load_raw_text)
+        self.results_tabs = results_tabs
+        
+        main_layout.addWidget(results_tabs, 1)
+        
+        # 添加作者信息
+        author_label = QLabel("by Lei Da (David)  Contact: greatradar@gmail.com")
+        author_label.setAlignment(Qt.AlignmentFlag.AlignRight)
+        author_label.setStyleSheet("color: #666; margin: 5px;")
+        main_layout.addWidget(author_label)
+        
+        # Status bar
+        self.status_bar = QStatusBar()
+        self.setStatusBar(self.status_bar)
+        self.status_bar.showMessage("准备就绪")
+        
+        self.setCentralWidget(main_widget)
+    
+    def select_file(self):
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "选择PDF或图片文件", "", "PDF/图片 (*.pdf *.png *.jpg *.jpeg *.tif *.tiff)"
+        )
+        
+        if file_path:
+            self.file_path_label.setText(file_path)
+            self.process_btn.setEnabled(True)
+    
+    def process_document(self):
+        file_path = self.file_path_label.text()
+        api_key = self.api_key_input.text()
+        
+        if not file_path or file_path == "未选择文件":
+            QMessageBox.warning(self, "错误", "请先选择一个PDF或图片文件")
+            return
+        
+        if not api_key:
+            api_key = os.environ.get("MISTRAL_API_KEY")
+            if not api_key:
+                QMessageBox.warning(self, "错误", "请提供Mistral API Key")
+                return
+        
+        model = self.model_combo.currentData()
+        image_format = self.image_format_combo.currentData()
+        error = image_format_error(image_format)
+        if error:
+            QMessageBox.warning(self, "错误", error)
+            return
+        
+        # Disable UI elements during processing
+        self.process_btn.setEnabled(False)
+        self.progress_bar.setVisible(True)
+        self.status_bar.showMessage("处理中...")
+        
+        # Start OCR in a separate thread
+        self.worker = OcrWorker(
+            file_path, api_key, model, self.cache_checkbox.isChecked(), self.chunk_spin.value(),
+            self.hybrid_checkbox.isChecked(), image_format, self.image_size_spin.value(),
+        )
+        self.worker.progress_updated.connect(self.update_progress)
+        self.worker.finished.connect(self.handle_results)
+        self.worker.error.connect(self.handle_error)
+        self.worker.start()
+    
+    def update_progress(self, message):
+        self.status_bar.showMessage(message)
+    
+    def handle_results(self, result, extracted_images):
+        self.response_data = result
+        self.extracted_images = extracted_images
+        # 页码 → 图片的索引只在结果到达时建立一次，预览和保存共用
+        self.image_index = build_image_index(extracted_images)
+        # 上一个结果的缩略图不再需要
+        if self.thumbnail_folder and self.thumbnail_folder != self.worker.thumbnail_folder:
+            shutil.rmtree(self.thumbnail_folder, ignore_errors=True)
+        self.thumbnail_folder = self.worker.thumbnail_folder
+        self.progress_bar.setVisible(False)
+        self.process_btn.setEnabled(True)
+        self.save_btn.setEnabled(True)
+        
+        # 原始数据在切换到该标签页时才序列化，每个结果只序列化一次
+        self.raw_text_loaded = False
+        self.raw_text.clear()
+        self.load_raw_text()
+        
+        # Process and display content based on selected format
+        output_format = self.format_combo.currentText().lower()
+        
+        # 生成预览（不创建实际文件）
+        self.preview_first_page = 0
+        self.preview_content(output_format)
+        
+        self.status_bar.showMessage("处理完成")
+    
+    def preview_content(self, output_format):
+        # 这只是预览，不创建实际文件和图片文件夹
+        # 只渲染当前可见的几页，转换在后台线程中进行
+        if not self.response_data:
+            return
+        
+        pages = self.response_data.get("pages", [])
+        page_count = len(pages)
+        first = self.preview_first_page
+        last = min(first + PREVIEW_PAGES_PER_VIEW, page_count)
+        self.preview_page_label.setText(f"第 {first + 1}-{last} 页 / 共 {page_count} 页" if page_count else "无内容")
+        self.prev_page_btn.setEnabled(first > 0)
+        self.next_page_btn.setEnabled(last < page_count)
+        
+        self.preview_request_id += 1
+        renderer = PreviewRenderer(
+            self.preview_request_id, pages[first:last], first, self.image_index, output_format
+        )
+        renderer.rendered.connect(self.show_preview)
+        # 保留线程引用直到运行结束
+        self.preview_renderers.add(renderer)
+        renderer.finished.connect(lambda: self.preview_renderers.discard(renderer))
+        renderer.start()
+    
+    def show_preview(self, request_id, content, is_html):
+        # 翻页或切换格式后，旧的渲染结果直接丢弃
+        if request_id != self.preview_request_id:
+            return
+        if is_html:
+            self.preview_text.setHtml(content)
+        else:
+            self.preview_text.setPlainText(content)
+    
+    def load_raw_text(self):
+        # Display raw JSON in the raw tab
+        if self.raw_text_loaded or not self.response_data:
+            return
+        if self.results_tabs.currentWidget() is not self.raw_text:
+            return
+        self.raw_text.setPlainText(
+            json.dumps(self.response_data, indent=4, ensure_ascii=False, default=json_default)
+        )
+        self.raw_text_loaded = True
+    
+    def refresh_preview(self):
+        self.preview_content(self.format_combo.currentText().lower())
+    
+    def show_previous_pages(self):
+        self.preview_first_page = max(0, self.preview_first_page - PREVIEW_PAGES_PER_VIEW)
+        self.refresh_preview()
+    
+    def show_next_pages(self):
+        self.preview_first_page += PREVIEW_PAGES_PER_VIEW
+        self.refresh_preview()
+    
+    def handle_error(self, error_message):
+        self.progress_bar.setVisible(False)
+        self.process_btn.setEnabled(True)
+        QMessageBox.critical(self, "错误", f"处理过程中出错: {error_message}")
+        self.status_bar.showMessage("处理失败")
+
+
+    def save_result(self):
+        if not self.response_data:
+            QMessageBox.warning(self, "警告", "没有要保存的结果")
+            return
+        
+        # 选择保存目录而不是文件
+        output_dir = QFileDialog.getExistingDirectory(
+            self, "选择保存目录", "",
+            options=QFileDialog.Option.ShowDirsOnly
+        )
+        
+        if not output_dir:
+            return
+        
+        self.output_folder = output_dir
+        
+        # 根据选择的格式保存内容
+        output_format = self.format_combo.currentText().lower()
+        with get_metrics().document(self.file_path_label.text()):
+            output_file = save_ocr_result(
+                self.response_data, self.extracted_images, output_dir, output_format,
+                progress=self.status_bar.showMessage, image_index=self.image_index,
+            )
+        
+        self.status_bar.showMessage(f"已保存到 {output_file}")
+        
+        # 加入全文索引，之后可在搜索标签页中检索
+        try:
+            get_default_index().add_result(
+                output_file, self.response_data, self.extracted_images,
+                source_path=self.file_path_label.text(), image_index=self.image_index,
+            )
+        except Exception as e:
+            self.status_bar.showMessage(f"已保存到 {output_file}（加入搜索索引失败: {str(e)}）")
+        
+        # 临时文件夹即将删除，预览和再次保存改为使用已保存的图片
+        for img_info in self.extracted_images:
+            img_info["path"] = os.path.join(output_dir, "images", img_info["filename"])
+        
+        # 清理临时文件夹
+        try:
+            if hasattr(self.worker, 'temp_image_folder') and self.worker.temp_image_folder:
+                shutil.rmtree(self.worker.temp_image_folder, ignore_errors=True)
+        except Exception as e:
+            self.status_bar.showMessage(f"警告: 清理临时文件时出错: {str(e)}")
+
+    def run_search(self):
+        query = self.search_input.text().strip()
+        self.search_results.clear()
+        if not query:
+            return
+        try:
+            hits = get_default_index().search(query, limit=100)
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"搜索时出错: {str(e)}")
+            return
+        for hit in hits:
+            source = hit["source_path"] or hit["output_file"]
+            item = QListWidgetItem(f"{Path(source).name}  第 {hit['page'] + 1} 页\n{hit['snippet']}")
+            item.setToolTip(hit["output_file"])
+            item.setData(Qt.ItemDataRole.UserRole, hit["output_file"])
+            self.search_results.addItem(item)
+        self.status_bar.showMessage(f"找到 {len(hits)} 条结果" if hits else "没有找到匹配的结果")
+    
+    def open_search_hit(self, item):
+        # 用系统默认程序打开命中的结果文件
+        QDesktopServices.openUrl(QUrl.fromLocalFile(item.data(Qt.ItemDataRole.UserRole)))
+    
+    def closeEvent(self, event):
+        # 退出时清理未保存结果留下的临时图片文件夹
+        worker = getattr(self, 'worker', None)
+        if worker is not None and worker.temp_image_folder:
+            shutil.rmtree(worker.temp_image_folder, ignore_errors=True)
+        if self.thumbnail_folder:
+            shutil.rmtree(self.thumbnail_folder, ignore_errors=True)
+        super().closeEvent(event)
+
+
+def main():
+    """启动图形界面，返回退出码"""
+    app = QApplication(sys.argv)
+    app.setStyle("Fusion")  # Modern look across platforms
+    # 退出前关闭复用的API连接
+    app.aboutToQuit.connect(close_backends)
+    window = MistralOcrApp()
+    window.show()
+    return app.exec()
@@ -0,0 +1,128 @@
+import re
+import statistics
+# PyMuPDF（fitz）用于读取PDF的文字层，首次使用时才导入
+
+
+# 页面文字少于该字符数时视为扫描页
+MIN_TEXT_CHARS = 50
+
+# 图片覆盖页面面积超过该比例时视为扫描页（扫描件常带有一层不可靠的OCR文字）
+MAX_IMAGE_COVERAGE = 0.8
+
+# 相对正文字号的标题阈值
+HEADING_SCALES = ((1.6, "# "), (1.25, "## "))
+
+# 中日韩文字之间换行时不插入空格
+_CJK_PATTERN = re.compile(r"[\u3000-\u30ff\u3400-\u9fff\uac00-\ud7af\uff00-\uffef]")
+
+
+def hybrid_result_key(model, hybrid):
+    """缓存和任务日志中区分混合模式结果与整份OCR结果的键"""
+    return f"{model}+text-layer" if hybrid else model
+
+
+def _image_coverage(page, image_infos):
+    import fitz
+    page_area = abs(page.rect) or 1
+    covered = 0.0
+    for info in image_infos:
+        covered += abs(fitz.Rect(info["bbox"]) & page.rect)
+    return min(1.0, covered / page_area)
+
+
+def is_text_page(page, image_infos=None):
+    """根据文字量和图片覆盖面积判断页面是否有可直接使用的文字层"""
+    if image_infos is None:
+        image_infos = page.get_image_info(xrefs=True)
+    text = page.get_text("text")
+    if len(text.strip()) < MIN_TEXT_CHARS:
+        return False
+    return _image_coverage(page, image_infos) < MAX_IMAGE_COVERAGE
+
+
+def _join_lines(lines):
+    text = ""
+    for line in lines:
+        if text and not (_CJK_PATTERN.match(text[-1]) and _CJK_PATTERN.match(line[0])):
+            text += " "
+        text += line
+    return text
+
+
+def page_markdown(page, image_infos=None):
+    """把带文字层的页面转换为与OCR结果相同结构的页面字典（index 需由调用方设置）
+
+    文字块按阅读顺序输出，字号明显大于正文的块作为标题；
+    图片按 get_images 的顺序编号，与 PdfImageExtractor 提取的图片一一对应，
+    并在其所在位置插入 markdown 图片引用。
+    """
+    if image_infos is None:
+        image_infos = page.get_image_info(xrefs=True)
+
+    blocks = [block for block in page.get_text("dict", sort=True)["blocks"] if block["type"] == 0]
+    sizes = [
+        span["size"]
+        for block in blocks for line in block["lines"] for span in line["spans"]
+        if span["text"].strip()
+    ]
+    body_size = statistics.median(sizes) if sizes else 0
+
+    items = []  # (y0, x0, markdown)
+    for block in blocks:
+        lines = []
+        block_size = 0
+        for line in block["lines"]:
+            text = "".join(span["text"] for span in line["spans"]).strip()
+            if text:
+                lines.append(text)
+                block_size = max(block_size, max(span["size"] for span in line["spans"]))
+        if not lines:
+            continue
+        text = _join_lines(lines)
+        for scale, prefix in HEADING_SCALES:
+            if body_size and block_size >= body_size * scale and len(text) < 200:
+                text = prefix + text
+                break
+        items.append((block["bbox"][1], block["bbox"][0], text))
+
+    # 图片ID按页内 get_images 顺序编号
+    image_numbers = {}
+    for img in page.get_images(full=True):
+        image_numbers.setdefault(img[0], len(image_numbers))
+    bboxes = {}
+    for info in image_infos:
+        bboxes.setdefault(info.get("xref"), info["bbox"])
+
+    images = []
+    for xref, image_number in image_numbers.items():
+        image_id = f"img-{image_number}"
+        x0, y0, x1, y1 = bboxes.get(xref, (0, 0, 0, 0))
+        images.append({
+            "id": image_id,
+            "top_left_x": int(x0), "top_left_y": int(y0),
+            "bottom_right_x": int(x1), "bottom_right_y": int(y1),
+            "image_base64": None,
+        })
+        items.append((y0, x0, f"![{image_id}]({image_id})"))
+
+    items.sort(key=lambda item: (item[0], item[1]))
+    return {
+        "markdown": "\n\n".join(text for _, _, text in items),
+        "images": images,
+        "dimensions": {"dpi": 72, "height": int(page.rect.height), "width": int(page.rect.width)},
+    }
+
+
+def split_text_pages(pdf_path):
+    """读取文字层，返回 ({页码: 本地生成的页面}, [需要OCR的扫描页页码])"""
+    import fitz
+    local_pages = {}
+    scanned_indexes = []
+    with fitz.open(pdf_path) as pdf_document:
+        for page_index, page in enumerate(pdf_document):
+            image_infos = page.get_image_info(xrefs=True)
+            if is_text_page(page, image_infos):
+                local_pages[page_index] = dict(page_markdown(page, image_infos), index=page_index)
+            else:
+                scanned_indexes.append(page_index)
+    return local_pages, scanned_indexes
@@ -0,0 +1,173 @@
+import os
+from ocr_cache import DEFAULT_CACHE_DIR, file_sha256
+from ocr_export import place_image
+from ocr_metrics import get_metrics
+# PyMuPDF（fitz）负责解码、缩放和编码JPEG/PNG，WebP 需要另外安装 Pillow；都在首次使用时才导入
+
+
+# 可选的转换格式及其文件扩展名，"original" 表示保留PDF中的原始数据
+IMAGE_FORMATS = {"original": None, "jpeg": "jpg", "png": "png", "webp": "webp"}
+DEFAULT_IMAGE_QUALITY = 85
+
+THUMBNAIL_SIZE = 320
+THUMBNAIL_QUALITY = 75
+
+# 转换结果按 (原图内容哈希, 转换参数) 缓存，同一张图片（如每份文档都有的logo）只转换一次
+IMAGE_CACHE_DIR = os.path.join(DEFAULT_CACHE_DIR, "images")
+IMAGE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# 图片数达到该值时才启用多进程转换，少量图片用单进程更快
+PARALLEL_TRANSCODE_MIN_IMAGES = 8
+
+
+def image_format_error(image_format):
+    """检查转换格式是否可用，不可用时返回错误信息"""
+    if image_format not in IMAGE_FORMATS:
+        return f"不支持的图片格式: {image_format}"
+    if image_format == "webp":
+        try:
+            import PIL  # noqa: F401
+        except ImportError:
+            return "转换为 WebP 需要安装 Pillow"
+    return None
+
+
+def _encode(src_path, image_format, quality, max_size):
+    """解码图片并按需缩小、转换色彩空间后编码，返回 (数据, 是否缩小过)"""
+    import fitz
+    pixmap = fitz.Pixmap(src_path)
+    if pixmap.colorspace is not None and pixmap.colorspace.n not in (1, 3):
+        # CMYK 等色彩空间转为 RGB，JPEG/PNG/WebP 编码器都支持
+        pixmap = fitz.Pixmap(fitz.csRGB, pixmap)
+    if pixmap.alpha and image_format == "jpeg":
+        pixmap = fitz.Pixmap(pixmap, 0)
+
+    scale = min(1.0, max_size / max(pixmap.width, pixmap.height)) if max_size else 1.0
+    if scale < 1.0:
+        pixmap = fitz.Pixmap(pixmap, max(1, round(pixmap.width * scale)), max(1, round(pixmap.height * scale)))
+
+    if image_format == "webp":
+        return pixmap.pil_tobytes(format="WEBP", quality=quality), scale < 1.0
+    if image_format == "jpeg":
+        return pixmap.tobytes("jpeg", jpg_quality=quality), scale < 1.0
+    return pixmap.tobytes("png"), scale < 1.0
+
+
+def transcode_image(src_path, dest_folder, image_format, quality=DEFAULT_IMAGE_QUALITY, max_size=0,
+                    cache_dir=IMAGE_CACHE_DIR, keep_larger=False):
+    """把一张图片转换后放入 dest_folder，返回新文件名；保留原图时返回 None
+
+    转换结果先写入以内容哈希命名的缓存文件，再复制（或写时复制克隆）到目标位置；
+    不使用硬链接，否则修改导出的图片会连带改掉缓存。未缩小尺寸且转换后反而更大时
+    保留原图，除非 keep_larger=True（缩略图总是使用转换结果）；两者分开缓存，
+    因此命中的缓存总是通过了同样的大小检查。
+    无法解码的图片（如部分JBIG2掩码）同样保留原图。可在子进程中调用。
+    """
+    extension = IMAGE_FORMATS[image_format]
+    stem = os.path.splitext(os.path.basename(src_path))[0]
+    cache_name = (f"{file_sha256(src_path)}_{image_format}_q{quality}_s{max_size}"
+                  f"{'_k' if keep_larger else ''}.{extension}")
+    cache_path = os.path.join(cache_dir, cache_name)
+
+    if os.path.exists(cache_path):
+        # 命中时刷新修改时间，淘汰缓存时按最近使用的顺序保留
+        os.utime(cache_path)
+    else:
+        try:
+            data, resized = _encode(src_path, image_format, quality, max_size)
+        except Exception:
+            return None
+        if not resized and not keep_larger and len(data) >= os.path.getsize(src_path):
+            return None
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, cache_path)
+
+    filename = f"{stem}.{extension}"
+    os.makedirs(dest_folder, exist_ok=True)
+    place_image(cache_path, os.path.join(dest_folder, filename), link=False)
+    return filename
+
+
+def _run_all(func, jobs):
+    """按数量选择单进程或多进程执行 func(*job)，返回与 jobs 对应的结果列表"""
+    if len(jobs) < PARALLEL_TRANSCODE_MIN_IMAGES:
+        return [func(*job) for job in jobs]
+    # 解码和编码是CPU密集型操作，分散到多个进程；进程池的导入和启动开销只在图片多时值得
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=min(len(jobs), os.cpu_count() or 1)) as executor:
+        return list(executor.map(func, *zip(*jobs), chunksize=4))
+
+
+def _unique_paths(extracted_images):
+    # 同一xref在多页出现时共用一个文件，只处理一次
+    return list(dict.fromkeys(img_info["path"] for img_info in extracted_images))
+
+
+def transcode_images(extracted_images, output_folder, image_format, quality=DEFAULT_IMAGE_QUALITY, max_size=0,
+                      cache_dir=IMAGE_CACHE_DIR):
+    """把提取的图片统一转换格式和最大边长，返回更新了 path/filename 的新图片列表
+
+    转换结果写入 output_folder，原图保持不变（中断后从任务日志继续时仍可使用）；
+    保留原图的条目不作修改。
+    """
+    if not extracted_images or (image_format == "original" and not max_size):
+        return extracted_images
+    if image_format == "original":
+        # 只限制尺寸时统一编码为PNG，避免有损压缩
+        image_format = "png"
+
+    src_paths = _unique_paths(extracted_images)
+    with get_metrics().stage("transcode", pages=len(src_paths)) as stage:
+        before = sum(os.path.getsize(path) for path in src_paths)
+        jobs = [(path, output_folder, image_format, quality, max_size, cache_dir) for path in src_paths]
+        filenames = dict(zip(src_paths, _run_all(transcode_image, jobs)))
+
+        converted = []
+        for img_info in extracted_images:
+            filename = filenames[img_info["path"]]
+            if filename is not None:
+                img_info = dict(img_info, filename=filename, path=os.path.join(output_folder, filename))
+            converted.append(img_info)
+        # 记录转换节省的字节数
+        stage.bytes = before - sum(os.path.getsize(path) for path in _unique_paths(converted))
+
+    prune_image_cache(cache_dir)
+    return converted
+
+
+def make_thumbnails(extracted_images, thumbnail_folder, size=THUMBNAIL_SIZE, cache_dir=IMAGE_CACHE_DIR):
+    """为预览生成缩略图，在每个图片信息中加入 thumbnail 路径（原地修改）"""
+    src_paths = _unique_paths(extracted_images)
+    if not src_paths:
+        return extracted_images
+    os.makedirs(thumbnail_folder, exist_ok=True)
+    with get_metrics().stage("thumbnails", pages=len(src_paths)):
+        jobs = [(path, thumbnail_folder, "jpeg", THUMBNAIL_QUALITY, size, cache_dir, True) for path in src_paths]
+        filenames = dict(zip(src_paths, _run_all(transcode_image, jobs)))
+    for img_info in extracted_images:
+        filename = filenames.get(img_info["path"])
+        if filename is not None:
+            img_info["thumbnail"] = os.path.join(thumbnail_folder, filename)
+    prune_image_cache(cache_dir)
+    return extracted_images
+
+
+def prune_image_cache(cache_dir=IMAGE_CACHE_DIR, max_bytes=IMAGE_CACHE_MAX_BYTES):
+    """缓存文件夹超出容量时按最近使用时间删除最旧的文件"""
+    try:
+        entries = [entry for entry in os.scandir(cache_dir) if entry.is_file() and not entry.name.endswith(".tmp")]
+    except OSError:
+        return
+    stats = [(entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in entries]
+    total = sum(size for _, size, _ in stats)
+    for _, size, path in sorted(stats):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
@@ -0,0 +1,320 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from pathlib import Path
+from ocr_export import IMAGE_REF_PATTERN, MARKDOWN_FOOTER, build_image_index, page_image_targets
+
+
+DEFAULT_INDEX_PATH = os.environ.get(
+    "MISTRAL_OCR_INDEX",
+    os.path.join(Path.home(), ".local", "share", "mistral_ocr", "search_index.sqlite3"),
+)
+DEFAULT_SEARCH_LIMIT = 20
+
+# 全文表的 rowid = 文档ID << _PAGE_BITS | 页码，删除或替换一个文档时按 rowid 范围操作
+_PAGE_BITS = 20
+
+# trigram 分词支持中文等不以空格分词的文字的子串匹配，但检索词至少需要3个字符
+_TRIGRAM_MIN_CHARS = 3
+
+# 回填已有结果时识别的输出文件
+RESULT_FILENAMES = {f"ocr_result.{ext}" for ext in ("json", "jsonl", "md")}
+
+
+def page_search_text(markdown_text):
+    """去掉图片引用（OCR结果中的说明文字只是图片ID），只保留可检索的文字"""
+    return IMAGE_REF_PATTERN.sub("", markdown_text).strip()
+
+
+def _make_snippet(text, terms, highlight, context_chars=40):
+    """LIKE 查询无法使用 FTS5 的 snippet()，在Python中截取第一个命中附近的文字"""
+    lowered = text.lower()
+    positions = [(lowered.find(term.lower()), term) for term in terms]
+    positions = [(pos, term) for pos, term in positions if pos >= 0]
+    if not positions:
+        return text[:context_chars * 2]
+    pos, term = min(positions)
+    start = max(0, pos - context_chars)
+    end = min(len(text), pos + len(term) + context_chars)
+    snippet = (text[start:pos] + highlight[0] + text[pos:pos + len(term)] + highlight[1]
+               + text[pos + len(term):end])
+    return ("…" if start else "") + snippet + ("…" if end < len(text) else "")
+
+
+class SearchIndex:
+    """所有OCR结果的本地全文检索索引（SQLite FTS5）
+
+    每页一条记录，保存去掉图片引用后的文字和该页图片的相对路径；
+    以输出文件为文档键，重新处理同一文档时替换旧的页面；
+    同一源文件以同一模型改用其他输出格式保存时也替换旧文件的页面。
+    同一个实例可被多个线程共享。
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY,
+                output_file TEXT NOT NULL UNIQUE,
+                source_path TEXT,
+                model TEXT,
+                sha256 TEXT,
+                page_count INTEGER NOT NULL,
+                indexed_at REAL NOT NULL
+            )"""
+        )
+        try:
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS page_text USING fts5("
+                "text, page UNINDEXED, images UNINDEXED, tokenize='trigram')"
+            )
+        except sqlite3.OperationalError:
+            # SQLite 3.34 之前没有 trigram 分词，中文只能按整段匹配
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS page_text USING fts5("
+                "text, page UNINDEXED, images UNINDEXED, tokenize='unicode61')"
+            )
+        self._conn.commit()
+        sql = self._conn.execute("SELECT sql FROM sqlite_master WHERE name = 'page_text'").fetchone()[0]
+        self.trigram = "trigram" in sql
+
+    def add_document(self, output_file, pages, source_path=None, model=None, sha256=None):
+        """写入或替换一个文档的索引，pages 为 [(页码, markdown, [图片相对路径, ...]), ...]
+
+        同一源文件以同一模型保存的旧结果（如改用其他输出格式后的旧文件）一并替换，避免重复命中。
+        """
+        output_file = os.path.abspath(output_file)
+        source_path = source_path and os.path.abspath(source_path)
+        rows = [
+            (page_index, page_search_text(markdown_text), json.dumps(images, ensure_ascii=False))
+            for page_index, markdown_text, images in pages
+        ]
+        with self._lock:
+            self._delete(output_file)
+            if source_path:
+                self._delete_source(source_path, model)
+            cursor = self._conn.execute(
+                "INSERT INTO documents (output_file, source_path, model, sha256, page_count, indexed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (output_file, source_path, model, sha256, len(rows), time.time()),
+            )
+            document_id = cursor.lastrowid
+            self._conn.executemany(
+                "INSERT INTO page_text (rowid, text, page, images) VALUES (?, ?, ?, ?)",
+                [((document_id << _PAGE_BITS) | page_index, text, page_index, images)
+                 for page_index, text, images in rows],
+            )
+            self._conn.commit()
+
+    def add_result(self, output_file, response_dict, extracted_images, source_path=None, model=None,
+                   sha256=None, image_index=None):
+        """把刚保存的OCR结果加入索引，图片路径与 save_ocr_result 写出的一致"""
+        if image_index is None:
+            image_index = build_image_index(extracted_images)
+        pages = []
+        for page_idx, page in enumerate(response_dict.get("pages", [])):
+            targets = page_image_targets(page, image_index.get(page_idx, []))
+            pages.append((
+                page_idx,
+                page.get("markdown", ""),
+                [f"images/{img_info['filename']}" for img_info in targets.values()],
+            ))
+        self.add_document(output_file, pages, source_path, model or response_dict.get("model"), sha256)
+
+    def remove_document(self, output_file):
+        with self._lock:
+            self._delete(os.path.abspath(output_file))
+            self._conn.commit()
+
+    def _delete(self, output_file):
+        # 调用方已持有锁
+        row = self._conn.execute("SELECT id FROM documents WHERE output_file = ?", (output_file,)).fetchone()
+        if row is not None:
+            self._delete_id(row[0])
+
+    def _delete_source(self, source_path, model):
+        # 调用方已持有锁
+        rows = self._conn.execute(
+            "SELECT id FROM documents WHERE source_path = ? AND model IS ?", (source_path, model)
+        ).fetchall()
+        for (document_id,) in rows:
+            self._delete_id(document_id)
+
+    def _delete_id(self, document_id):
+        # 调用方已持有锁
+        self._conn.execute(
+            "DELETE FROM page_text WHERE rowid BETWEEN ? AND ?",
+            (document_id << _PAGE_BITS, ((document_id + 1) << _PAGE_BITS) - 1),
+        )
+        self._conn.execute("DELETE FROM documents WHERE id = ?", (document_id,))
+
+    def search(self, query, limit=DEFAULT_SEARCH_LIMIT, highlight=("[", "]")):
+        """返回按相关度排序的命中页列表
+
+        每项包含 output_file、source_path、page（从0开始）、snippet 和 images（绝对路径）。
+        多个检索词以空格分隔，需同时出现在同一页中。
+        """
+        terms = query.split()
+        if not terms:
+            return []
+        if self.trigram:
+            match_terms = [term for term in terms if len(term) >= _TRIGRAM_MIN_CHARS]
+        else:
+            match_terms = terms
+        like_terms = [term for term in terms if term not in match_terms]
+
+        conditions = []
+        params = []
+        if match_terms:
+            conditions.append("page_text MATCH ?")
+            params.append(" ".join('"' + term.replace('"', '""') + '"' for term in match_terms))
+        for term in like_terms:
+            # 过短的检索词无法使用 trigram 索引，退回逐页匹配
+            conditions.append("page_text.text LIKE ? ESCAPE '\\'")
+            params.append("%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+
+        if match_terms:
+            # trigram 分词时每个词元约为一个字符
+            columns = f"snippet(page_text, 0, ?, ?, '…', {48 if self.trigram else 16})"
+            order = "bm25(page_text)"
+            params = [*highlight, *params]
+        else:
+            columns = "page_text.text"
+            order = "documents.output_file, page_text.page"
+        sql = (
+            f"SELECT documents.output_file, documents.source_path, page_text.page, page_text.images, {columns} "
+            f"FROM page_text JOIN documents ON documents.id = (page_text.rowid >> {_PAGE_BITS}) "
+            f"WHERE {' AND '.join(conditions)} ORDER BY {order} LIMIT ?"
+        )
+        with self._lock:
+            rows = self._conn.execute(sql, (*params, limit)).fetchall()
+
+        hits = []
+        for output_file, source_path, page_index, images, text in rows:
+            output_dir = os.path.dirname(output_file)
+            hits.append({
+                "output_file": output_file,
+                "source_path": source_path,
+                "page": page_index,
+                "snippet": " ".join((text if match_terms else _make_snippet(text, like_terms, highlight)).split()),
+                "images": [os.path.join(output_dir, image) for image in json.loads(images)],
+            })
+        return hits
+
+    def stats(self):
+        """返回 (文档数, 页数)"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*), COALESCE(SUM(page_count), 0) FROM documents").fetchone()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def read_result_pages(output_file):
+    """从已保存的结果文件读取 [(页码, markdown, [图片相对路径, ...]), ...]
+
+    JSON/JSONL 按页读取；markdown 文件不保留分页信息，整份作为第0页。
+    """
+    suffix = Path(output_file).suffix.lower()
+    with open(output_file, encoding="utf-8") as f:
+        if suffix == ".md":
+            text = f.read()
+            if text.endswith(MARKDOWN_FOOTER):
+                text = text[:-len(MARKDOWN_FOOTER)]
+            images = [target for _, target in IMAGE_REF_PATTERN.findall(text)]
+            return [(0, text, images)]
+        if suffix == ".jsonl":
+            pages = [json.loads(line) for line in f if line.strip()]
+        else:
+            pages = json.load(f).get("pages", [])
+    return [
+        (page.get("index", page_idx), page.get("markdown", ""),
+         [img["local_path"] for img in page.get("images", []) if img.get("local_path")])
+        for page_idx, page in enumerate(pages)
+    ]
+
+
+def index_result_tree(index, root, log=print):
+    """回填目录树中已保存的全部结果，返回新建立索引的文档数"""
+    count = 0
+    for output_file in sorted(Path(root).rglob("ocr_result.*")):
+        if output_file.name not in RESULT_FILENAMES:
+            continue
+        try:
+            index.add_document(str(output_file), read_result_pages(output_file))
+            count += 1
+        except Exception as e:
+            log(f"无法索引 {output_file}: {str(e)}")
+    return count
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def get_default_index():
+    """返回进程内共享的默认索引实例"""
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = SearchIndex()
+        return _default_index
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="mistral-ocr search",
+        description="在已保存的OCR结果中全文检索，返回命中的页和上下文",
+    )
+    parser.add_argument("query", nargs="*", help="检索词，多个词以空格分隔，需同时出现在同一页")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH, help=f"索引文件（默认: {DEFAULT_INDEX_PATH}）")
+    parser.add_argument("-n", "--limit", type=int, default=DEFAULT_SEARCH_LIMIT,
+                        help=f"最多返回的结果数（默认: {DEFAULT_SEARCH_LIMIT}）")
+    parser.add_argument("--json", action="store_true", help="以JSON行输出结果")
+    parser.add_argument("--add", metavar="DIR", action="append", default=[],
+                        help="把目录树中已保存的结果（ocr_result.json/jsonl/md）加入索引，可重复指定")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not args.query and not args.add:
+        print("错误: 请提供检索词或 --add 目录", file=sys.stderr)
+        return 2
+
+    index = SearchIndex(args.index)
+    try:
+        for root in args.add:
+            count = index_result_tree(index, root)
+            print(f"已索引 {root} 中的 {count} 个结果")
+        if not args.query:
+            return 0
+
+        start = time.perf_counter()
+        hits = index.search(" ".join(args.query), args.limit)
+        elapsed = time.perf_counter() - start
+        for hit in hits:
+            if args.json:
+                print(json.dumps(hit, ensure_ascii=False))
+            else:
+                print(f"{hit['output_file']} 第 {hit['page'] + 1} 页")
+                print(f"    {hit['snippet']}")
+        if not args.json:
+            document_count, page_count = index.stats()
+            print(f"共 {len(hits)} 条结果（检索 {document_count} 个文档 {page_count} 页，耗时 {elapsed * 1000:.1f} 毫秒）")
+    finally:
+        index.close()
+    return 0 if hits else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,367 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from ocr_cache import file_sha256
+from ocr_retry import error_status_code
+from ocr_metrics import get_metrics, in_current_context
+from ocr_pipeline import (PdfImageExtractor, upload_file, get_signed_url, process_document_url,
+                          delete_uploaded_file, ocr_file_chunked, ocr_file_by_pages, ocr_inline, fits_inline,
+                          is_image_file, pages_with_images, plan_pages, DEFAULT_CHUNK_WORKERS, DEFAULT_INLINE_MAX_BYTES)
+from ocr_chunking import pdf_page_hashes
+from ocr_hybrid import hybrid_result_key
+from ocr_result import json_default
+
+
+# 文档处理阶段，按先后顺序排列
+STAGE_PENDING = "pending"
+STAGE_EXTRACTED = "extracted"
+STAGE_UPLOADED = "uploaded"
+STAGE_SIGNED = "signed"
+STAGE_OCR_DONE = "ocr_done"
+STAGE_SAVED = "saved"
+
+STAGES = [STAGE_PENDING, STAGE_EXTRACTED, STAGE_UPLOADED, STAGE_SIGNED, STAGE_OCR_DONE, STAGE_SAVED]
+
+JOURNAL_FILENAME = ".ocr_journal.sqlite3"
+
+# 以JSON文本保存的字段
+_JSON_COLUMNS = ("images", "response")
+
+_COLUMNS = ["path", "sha256", "model", "stage", "file_id", "images", "response",
+            "output_file", "output_options", "file_size", "file_mtime_ns", "attempts", "error", "updated_at"]
+
+# 旧版本创建的日志缺少的列
+_ADDED_COLUMNS = {"output_options": "TEXT", "file_size": "INTEGER", "file_mtime_ns": "INTEGER"}
+
+
+def stage_reached(job, stage):
+    return STAGES.index(job["stage"]) >= STAGES.index(stage)
+
+
+def saved_unchanged(job, stat):
+    """任务已保存，且文件的大小和修改时间（纳秒）与计算哈希时记录的完全一致
+
+    处理期间文件被改写时修改时间会变化，即使改写早于保存完成也不会被误认为未变化。
+    """
+    return (job["stage"] == STAGE_SAVED and job["file_mtime_ns"] is not None
+            and (job["file_size"], job["file_mtime_ns"]) == (stat.st_size, stat.st_mtime_ns))
+
+
+def _no_progress(message):
+    pass
+
+
+class JobJournal:
+    """记录每个文档处理阶段的持久化任务日志（SQLite）
+
+    进程崩溃或网络中断后重新运行时，可以从最后完成的阶段继续，
+    不必重新上传或重新OCR；同一个实例可被多个线程共享。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                path TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL,
+                model TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                file_id TEXT,
+                images TEXT,
+                response TEXT,
+                output_file TEXT,
+                output_options TEXT,
+                file_size INTEGER,
+                file_mtime_ns INTEGER,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                updated_at REAL NOT NULL
+            )"""
+        )
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for name, column_type in _ADDED_COLUMNS.items():
+            if name not in existing:
+                # 旧版本创建的日志中已保存的文档会重新计算一次哈希，并按新选项重新保存一次
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {column_type}")
+        self._conn.commit()
+
+    def get(self, path):
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE path = ?", (path,)
+            ).fetchone()
+        return dict(zip(_COLUMNS, row)) if row else None
+
+    def reset(self, path, sha256, model):
+        """为文档新建（或重置）一条任务记录"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (path, sha256, model, stage, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (path, sha256, model, STAGE_PENDING, time.time()),
+            )
+            self._conn.commit()
+
+    def update(self, path, **fields):
+        """更新字段；images 和 response 传入原始对象，由日志编码为JSON"""
+        fields = self._encode(fields)
+        with self._lock:
+            self._update(path, fields)
+
+    def advance(self, path, stage, **fields):
+        """推进到 stage 并更新字段；各阶段可能并行完成，已处于更后阶段时不回退"""
+        fields = self._encode(fields)
+        # 读取当前阶段和写入在同一次加锁内完成，避免并行的线程用较早的阶段覆盖较晚的阶段
+        with self._lock:
+            row = self._conn.execute("SELECT stage FROM jobs WHERE path = ?", (path,)).fetchone()
+            if row is not None and STAGES.index(row[0]) > STAGES.index(stage):
+                stage = row[0]
+            self._update(path, dict(fields, stage=stage))
+
+    @staticmethod
+    def _encode(fields):
+        for name in _JSON_COLUMNS:
+            if fields.get(name) is not None:
+                fields[name] = json.dumps(fields[name], ensure_ascii=False, default=json_default)
+        return fields
+
+    def _update(self, path, fields):
+        # 调用方已持有锁
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        self._conn.execute(f"UPDATE jobs SET {assignments} WHERE path = ?", (*fields.values(), path))
+        self._conn.commit()
+
+    def record_failure(self, path, error):
+        """记录失败原因，保留已完成的阶段以便下次继续"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET attempts = attempts + 1, error = ?, updated_at = ? WHERE path = ?",
+                (error, time.time(), path),
+            )
+            self._conn.commit()
+
+    def mark_saved(self, path, output_file, output_options=None, file_stat=None):
+        """标记结果已写入输出目录，不再需要保留中间数据
+
+        file_stat 为计算哈希之前取得的 os.stat 结果，记录其大小和修改时间供 saved_sha256 核对。
+        """
+        self.update(path, stage=STAGE_SAVED, output_file=output_file, output_options=output_options,
+                    file_size=file_stat.st_size if file_stat else None,
+                    file_mtime_ns=file_stat.st_mtime_ns if file_stat else None,
+                    images=None, response=None, error=None)
+
+    def saved_sha256(self, path, stat):
+        """已保存且文件大小和修改时间与计算哈希时完全一致时返回日志中的哈希，无需再读取文件"""
+        job = self.get(path)
+        if job and saved_unchanged(job, stat):
+            return job["sha256"]
+        return None
+
+    def completed_output(self, path, sha256, model, output_options=None):
+        """内容、模型和输出选项都未变化且输出文件仍存在时，返回已保存的输出文件路径"""
+        job = self.get(path)
+        if (job and job["stage"] == STAGE_SAVED and job["sha256"] == sha256 and job["model"] == model
+                and job["output_options"] == output_options
+                and job["output_file"] and os.path.exists(job["output_file"])):
+            return job["output_file"]
+        return None
+
+    def orphaned_uploads(self):
+        """不会再被复用的远端上传文件: [(path, file_id)]
+
+        包括OCR已完成但未能删除的上传，以及中断时残留的部分页上传（阶段未到 uploaded）；
+        处于 uploaded/signed 阶段的整份文档上传留给继续运行时复用。
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT path, file_id FROM jobs WHERE file_id IS NOT NULL AND stage NOT IN (?, ?)",
+                (STAGE_UPLOADED, STAGE_SIGNED),
+            ).fetchall()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class MemoryJournal:
+    """只在内存中记录的任务日志，单次处理（如图形界面）借此复用 run_ocr_resumable 的流程
+
+    不做断点续传，因此不保存提取的图片列表和OCR结果，也不需要序列化它们；
+    只记录阶段和 file_id，以便处理结束时删除上传的文件。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    def get(self, path):
+        with self._lock:
+            job = self._jobs.get(path)
+            return dict(job) if job else None
+
+    def reset(self, path, sha256, model):
+        with self._lock:
+            self._jobs[path] = dict(dict.fromkeys(_COLUMNS), path=path, sha256=sha256, model=model,
+                                    stage=STAGE_PENDING, attempts=0, updated_at=time.time())
+
+    def update(self, path, **fields):
+        for name in _JSON_COLUMNS:
+            fields.pop(name, None)
+        with self._lock:
+            self._jobs[path].update(fields, updated_at=time.time())
+
+    def advance(self, path, stage, **fields):
+        for name in _JSON_COLUMNS:
+            fields.pop(name, None)
+        with self._lock:
+            job = self._jobs[path]
+            if STAGES.index(job["stage"]) > STAGES.index(stage):
+                stage = job["stage"]
+            job.update(fields, stage=stage, updated_at=time.time())
+
+
+def cleanup_orphaned_uploads(backend, journal, progress=None):
+    """删除上次运行中残留在服务器上的上传文件"""
+    for path, file_id in journal.orphaned_uploads():
+        if delete_uploaded_file(backend, file_id, progress):
+            journal.update(path, file_id=None)
+
+
+def run_ocr_resumable(backend, file_path, model, image_folder, journal, progress=None, cache=None,
+                      chunk_pages=0, chunk_workers=DEFAULT_CHUNK_WORKERS, lazy_images=False, pdf_sha256=None,
+                      inline_max_bytes=DEFAULT_INLINE_MAX_BYTES, hybrid=False):
+    """对单个PDF（或独立图片）执行 提取图片 → 上传 → 签名URL → OCR，并把每个阶段写入任务日志
+
+    重新运行时从最后完成的阶段继续；journal 为 MemoryJournal 时即 run_ocr 的单次处理。
+    返回 (response_dict, extracted_images)。分块发送时只在文档级别记录阶段，
+    各分块的上传不做断点续传；内联发送的小文件没有上传阶段。
+    混合模式或分页缓存使部分页无需OCR时只发送其余页组成的PDF，这份上传只记录 file_id
+    （阶段不推进到 uploaded），中断后可以清理，但不会被当作整份文档复用。
+    """
+    progress = progress or _no_progress
+    job_key = os.path.abspath(file_path)
+    pdf_sha256 = pdf_sha256 or file_sha256(file_path)
+    # 任务日志和缓存中以 result_key 区分混合模式与整份OCR的结果
+    result_key = hybrid_result_key(model, hybrid)
+
+    job = journal.get(job_key)
+    if job is None or job["sha256"] != pdf_sha256 or job["model"] != result_key:
+        # 新文档或内容已变化，丢弃旧的进度
+        if job and job["file_id"]:
+            delete_uploaded_file(backend, job["file_id"], progress)
+        journal.reset(job_key, pdf_sha256, result_key)
+        job = journal.get(job_key)
+    elif job["file_id"] and not stage_reached(job, STAGE_UPLOADED):
+        # 上次中断时残留的部分页上传，不能用于整份文档
+        if delete_uploaded_file(backend, job["file_id"], progress):
+            journal.update(job_key, file_id=None)
+        job = journal.get(job_key)
+
+    def extract(pages=None):
+        progress("正在提取PDF中的图片...")
+        images = PdfImageExtractor(file_path).extract_images(image_folder, pages=pages)
+        journal.advance(job_key, STAGE_EXTRACTED, images=images)
+        return images
+
+    # 本地提取图片与上传/OCR往返并行进行，只在需要结果时等待
+    extracted_images = None
+    extract_future = None
+    with ThreadPoolExecutor(max_workers=1) as extract_executor:
+        if job["images"] is not None and os.path.isdir(image_folder):
+            extracted_images = json.loads(job["images"])
+        elif not lazy_images:
+            extract_future = extract_executor.submit(in_current_context(extract))
+
+        if stage_reached(job, STAGE_OCR_DONE) and job["response"] is not None:
+            response_dict = json.loads(job["response"])
+        else:
+            response_dict = None
+            if cache is not None:
+                with get_metrics().stage("cache_lookup", status="miss") as stage:
+                    response_dict = cache.get(pdf_sha256, result_key)
+                    if response_dict is not None:
+                        stage.status = "hit"
+            cache_hit = response_dict is not None
+            plan = None
+            if (not cache_hit and (hybrid or cache is not None) and not is_image_file(file_path)
+                    and not job["file_id"]):
+                # 按页查找可直接读取或复用的页；已上传整份文档时仍从日志继续
+                plan = plan_pages(file_path, model, progress, hybrid, cache)
+
+            if cache_hit:
+                progress("命中缓存，跳过OCR")
+            elif plan is not None and plan[0]:
+                response_dict = ocr_file_by_pages(
+                    backend, file_path, model, plan, progress, chunk_pages, chunk_workers, inline_max_bytes,
+                    on_upload=lambda file_id: journal.update(job_key, file_id=file_id),
+                )
+            elif chunk_pages > 0:
+                response_dict = ocr_file_chunked(backend, file_path, model, chunk_pages, chunk_workers, progress,
+                                                 inline_max_bytes)
+            elif not job["file_id"] and fits_inline(file_path, inline_max_bytes):
+                response_dict, _ = ocr_inline(backend, file_path, model, progress)
+            else:
+                response_dict = _ocr_from_journal(backend, file_path, model, job, journal, progress)
+
+            if cache is not None and not cache_hit:
+                # 新OCR的页同时按页写入缓存，修订版中未变化的页可以复用；每页只序列化一次
+                if plan is not None:
+                    page_hashes = plan[2]
+                elif job["file_id"] and not is_image_file(file_path):
+                    # 从日志继续的整份上传没有经过 plan_pages
+                    page_hashes = pdf_page_hashes(file_path, range(len(response_dict.get("pages", []))))
+                else:
+                    page_hashes = None
+                cache.put(pdf_sha256, result_key, response_dict, page_hashes)
+            journal.advance(job_key, STAGE_OCR_DONE, response=response_dict)
+
+        # 清理上传的文件
+        job = journal.get(job_key)
+        if job["file_id"] and delete_uploaded_file(backend, job["file_id"], progress):
+            journal.update(job_key, file_id=None)
+
+    if extract_future is not None:
+        extracted_images = extract_future.result()
+    elif extracted_images is None:
+        # 延迟提取: 只提取OCR结果中含有图片的页
+        extracted_images = extract(pages_with_images(response_dict))
+
+    return response_dict, extracted_images
+
+
+def _upload_checked(backend, file_path, job, journal, progress):
+    """上传文件并核对上传时顺带计算的哈希，文件在哈希之后被修改时放弃本次结果"""
+    progress("上传文件中...")
+    file_id, uploaded_sha256 = upload_file(backend, file_path, progress)
+    if uploaded_sha256 != job["sha256"]:
+        delete_uploaded_file(backend, file_id, progress)
+        raise RuntimeError("文件在处理过程中被修改，请在写入完成后重新处理")
+    journal.advance(job["path"], STAGE_UPLOADED, file_id=file_id)
+    return file_id
+
+
+def _ocr_from_journal(backend, file_path, model, job, journal, progress):
+    """上传 → 签名URL → OCR，已上传过的文件直接复用其 file_id"""
+    job_key = job["path"]
+    file_id = job["file_id"]
+    if not file_id:
+        file_id = _upload_checked(backend, file_path, job, journal, progress)
+
+    try:
+        document_url = get_signed_url(backend, file_id, progress)
+    except Exception as e:
+        if error_status_code(e) != 404:
+            raise
+        # 之前上传的文件在服务器上已不存在，重新上传
+        file_id = _upload_checked(backend, file_path, job, journal, progress)
+        document_url = get_signed_url(backend, file_id, progress)
+    journal.advance(job_key, STAGE_SIGNED)
+
+    progress("OCR处理中...")
+    return process_document_url(backend, document_url, model, progress, image=is_image_file(file_path))
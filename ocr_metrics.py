@@ -0,0 +1,242 @@
+import os
+import sys
+import json
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+
+
+METRIC_PREFIX = "mistral_ocr"
+
+# 阶段耗时直方图的桶上界（秒）
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# 当前正在处理的文档，写入每条事件，便于按文档统计耗时
+_current_document = contextvars.ContextVar("ocr_metrics_document", default=None)
+
+
+class StageTimer:
+    """一次阶段执行的计时结果，with 块内可补充字节数、页数和重试次数"""
+
+    def __init__(self, name, bytes=0, pages=0, retries=0, status="ok"):
+        self.name = name
+        self.bytes = bytes
+        self.pages = pages
+        self.retries = retries
+        self.status = status
+        self.seconds = 0.0
+
+    def count_retry(self, *args):
+        self.retries += 1
+
+
+class _StageStats:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.bytes = 0
+        self.pages = 0
+        self.retries = 0
+        self.errors = 0
+        self.buckets = [0] * (len(DURATION_BUCKETS) + 1)
+
+
+class MetricsRecorder:
+    """按阶段记录耗时、字节数、页数和重试次数
+
+    每次阶段执行都会累加到进程内的汇总（可导出为 Prometheus 文本格式），
+    打开日志后还会以 JSON 行的形式逐条写出事件。可在多个线程中同时使用。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._documents = {}
+        self._log = None
+        self._owns_log = False
+
+    def open_log(self, path):
+        """把每条事件以JSON行追加写入 path，"-" 表示标准错误"""
+        with self._lock:
+            self._close_log()
+            if path == "-":
+                self._log, self._owns_log = sys.stderr, False
+            else:
+                self._log, self._owns_log = open(path, "a", encoding="utf-8", buffering=1), True
+
+    def _close_log(self):
+        if self._log is not None and self._owns_log:
+            self._log.close()
+        self._log, self._owns_log = None, False
+
+    def close(self):
+        with self._lock:
+            self._close_log()
+
+    @contextmanager
+    def document(self, path):
+        """with 块内（包括复制了上下文的线程池任务）记录的事件都归属于该文档"""
+        token = _current_document.set(str(path))
+        try:
+            yield
+        finally:
+            _current_document.reset(token)
+
+    @contextmanager
+    def stage(self, name, **fields):
+        """计时一个阶段，异常时记为 error 后继续抛出"""
+        timer = StageTimer(name, **fields)
+        start = time.perf_counter()
+        try:
+            yield timer
+        except BaseException:
+            timer.status = "error"
+            raise
+        finally:
+            timer.seconds = time.perf_counter() - start
+            self._record(timer)
+
+    def record(self, name, seconds, **fields):
+        """记录一个在别处计时的阶段（如逐页累计的耗时）"""
+        timer = StageTimer(name, **fields)
+        timer.seconds = seconds
+        self._record(timer)
+
+    def count_document(self, status):
+        """统计文档处理结果: succeeded / skipped / failed"""
+        with self._lock:
+            self._documents[status] = self._documents.get(status, 0) + 1
+            self._write_event({"event": "document", "document": _current_document.get(), "status": status})
+
+    def _record(self, timer):
+        with self._lock:
+            stats = self._stages.get(timer.name)
+            if stats is None:
+                stats = self._stages[timer.name] = _StageStats()
+            stats.count += 1
+            stats.seconds += timer.seconds
+            stats.bytes += timer.bytes
+            stats.pages += timer.pages
+            stats.retries += timer.retries
+            if timer.status == "error":
+                stats.errors += 1
+            stats.buckets[bisect.bisect_left(DURATION_BUCKETS, timer.seconds)] += 1
+
+            self._write_event({
+                "event": "stage",
+                "document": _current_document.get(),
+                "stage": timer.name,
+                "seconds": round(timer.seconds, 6),
+                "bytes": timer.bytes,
+                "pages": timer.pages,
+                "retries": timer.retries,
+                "status": timer.status,
+            })
+
+    def _write_event(self, event):
+        # 调用方已持有锁，保证多线程写出的行不会交错
+        if self._log is None:
+            return
+        event = dict(ts=round(time.time(), 3), **event)
+        try:
+            self._log.write(json.dumps(event, ensure_ascii=False) + "\n")
+        except Exception:
+            pass
+
+    def summary(self):
+        """返回 {阶段: {count, seconds, bytes, pages, retries, errors}}"""
+        with self._lock:
+            return {
+                name: {
+                    "count": stats.count,
+                    "seconds": stats.seconds,
+                    "bytes": stats.bytes,
+                    "pages": stats.pages,
+                    "retries": stats.retries,
+                    "errors": stats.errors,
+                }
+                for name, stats in self._stages.items()
+            }
+
+    def prometheus_text(self):
+        """以 Prometheus 文本格式导出汇总指标"""
+        with self._lock:
+            stages = sorted(self._stages.items())
+            documents = sorted(self._documents.items())
+
+        name = f"{METRIC_PREFIX}_stage_duration_seconds"
+        lines = [f"# HELP {name} 各阶段耗时", f"# TYPE {name} histogram"]
+        for stage, stats in stages:
+            cumulative = 0
+            for bound, count in zip(DURATION_BUCKETS, stats.buckets):
+                cumulative += count
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {stats.count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {stats.seconds:.6f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {stats.count}')
+
+        for field, help_text in (("bytes", "各阶段处理的字节数"), ("pages", "各阶段处理的页数"),
+                                 ("retries", "各阶段的重试次数"), ("errors", "各阶段的失败次数")):
+            name = f"{METRIC_PREFIX}_stage_{field}_total"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for stage, stats in stages:
+                lines.append(f'{name}{{stage="{stage}"}} {getattr(stats, field)}')
+
+        name = f"{METRIC_PREFIX}_documents_total"
+        lines.append(f"# HELP {name} 按结果统计的文档数")
+        lines.append(f"# TYPE {name} counter")
+        for status, count in documents:
+            lines.append(f'{name}{{status="{status}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus_file(self, path):
+        """原子地写出指标文件，供 node_exporter 的 textfile collector 读取"""
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(temp_path, path)
+
+    def serve_prometheus(self, port, host="127.0.0.1"):
+        """在后台线程中提供 /metrics 接口，返回 server（调用 shutdown() 停止）"""
+        # http.server 导入较慢，只有开启指标接口时才需要
+        from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+        recorder = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = recorder.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+def in_current_context(func):
+    """包装 func，使其在线程池中执行时仍归属当前文档；每次提交任务都需单独包装"""
+    context = contextvars.copy_context()
+
+    def _run(*args, **kwargs):
+        return context.run(func, *args, **kwargs)
+    return _run
+
+
+_metrics = MetricsRecorder()
+
+
+def get_metrics():
+    """返回进程内共享的指标记录器"""
+    return _metrics
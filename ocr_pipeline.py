@@ -0,0 +1,393 @@
+import os
+import base64
+import hashlib
+import tempfile
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from ocr_cache import HashingReader
+from ocr_retry import retry_call
+from ocr_chunking import (page_ranges, pdf_page_count, split_pdf, merge_chunk_responses, extract_pages,
+                          pdf_page_hashes, merge_page_results)
+from ocr_metrics import get_metrics, in_current_context
+from ocr_ratelimit import get_rate_limiter, FILES_KEY
+from ocr_hybrid import split_text_pages
+from ocr_result import OcrPage
+
+
+DEFAULT_CHUNK_WORKERS = 4
+
+# 不超过该大小的文件直接以 data URL 内联发送，省去上传、签名URL和删除三次往返
+DEFAULT_INLINE_MAX_BYTES = 4 * 1024 * 1024
+
+# 可直接OCR的独立图片格式及其MIME类型
+IMAGE_MIME_TYPES = {
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".tif": "image/tiff",
+    ".tiff": "image/tiff",
+}
+
+
+# 页数达到该值时才启用多进程提取，小文档用单进程更快
+PARALLEL_EXTRACT_MIN_PAGES = 64
+
+
+def is_image_file(file_path):
+    """是否为可直接OCR的独立图片（按扩展名判断）"""
+    return Path(file_path).suffix.lower() in IMAGE_MIME_TYPES
+
+
+def _write_images(pdf_document, output_folder, items):
+    """提取一组 (xref, 基础文件名) 对应的图片并写入文件，返回 {xref: 文件名}"""
+    filenames = {}
+    for xref, base_name in items:
+        base_image = pdf_document.extract_image(xref)
+        if not base_image:
+            continue
+        image_filename = f"{base_name}.{base_image['ext']}"
+        with open(os.path.join(output_folder, image_filename), "wb") as img_file:
+            img_file.write(base_image["image"])
+        filenames[xref] = image_filename
+    return filenames
+
+
+def _extract_xrefs_in_process(pdf_path, output_folder, items):
+    """子进程入口: 各自打开PDF，提取分配到的xref"""
+    import fitz
+    with fitz.open(pdf_path) as pdf_document:
+        return _write_images(pdf_document, output_folder, items)
+
+
+class PdfImageExtractor:
+    def __init__(self, pdf_path, max_workers=None):
+        self.pdf_path = pdf_path
+        self.max_workers = max_workers or os.cpu_count() or 1
+
+    def extract_images(self, output_folder, pages=None):
+        """从PDF提取图片并保存到指定文件夹
+
+        同一个xref（如每页重复的logo、页眉）只解码和写入一次，各页的记录指向同一个文件；
+        pages 为页码(从0开始)集合时只提取这些页。大文档的解码在多个进程中并行进行。
+        """
+        os.makedirs(output_folder, exist_ok=True)
+        if is_image_file(self.pdf_path):
+            # 独立图片本身就是OCR输入，没有内嵌图片需要提取
+            return []
+
+        with get_metrics().stage("extract") as stage:
+            return self._extract_images(output_folder, pages, stage)
+
+    def _extract_images(self, output_folder, pages, stage):
+        # PyMuPDF（fitz）导入较慢，到真正提取图片时才导入
+        import fitz
+        try:
+            # 先收集每页引用的图片xref（不解码，开销很小），再对xref去重
+            occurrences = []
+            base_names = {}
+            with fitz.open(self.pdf_path) as pdf_document:
+                page_count = len(pdf_document)
+                if pages is None:
+                    page_indexes = range(page_count)
+                else:
+                    page_indexes = sorted(p for p in set(pages) if 0 <= p < page_count)
+
+                for page_index in page_indexes:
+                    image_list = pdf_document[page_index].get_images(full=True)
+                    for img_index, img in enumerate(image_list):
+                        xref = img[0]
+                        occurrences.append((page_index, xref))
+                        # 以首次出现的位置命名，创建唯一的图像名称
+                        base_names.setdefault(xref, f"page{page_index+1}_img{img_index+1}")
+
+                workers = min(self.max_workers, len(base_names))
+                if len(page_indexes) < PARALLEL_EXTRACT_MIN_PAGES or workers <= 1:
+                    filenames = _write_images(pdf_document, output_folder, base_names.items())
+                else:
+                    filenames = self._extract_parallel(output_folder, list(base_names.items()), workers)
+
+            stage.pages = len(page_indexes)
+            stage.bytes = sum(os.path.getsize(os.path.join(output_folder, name)) for name in filenames.values())
+
+            image_paths = []
+            for page_index, xref in occurrences:
+                if xref in filenames:
+                    image_paths.append({
+                        "path": os.path.join(output_folder, filenames[xref]),
+                        "filename": filenames[xref],
+                        "page": page_index
+                    })
+            return image_paths
+
+        except Exception as e:
+            stage.status = "error"
+            print(f"提取图片时出错: {str(e)}")
+            return []
+
+    def _extract_parallel(self, output_folder, items, workers):
+        from concurrent.futures import ProcessPoolExecutor
+        filenames = {}
+        groups = [items[i::workers] for i in range(workers)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_extract_xrefs_in_process, self.pdf_path, output_folder, group)
+                for group in groups
+            ]
+            for future in futures:
+                filenames.update(future.result())
+        return filenames
+
+
+def _no_progress(message):
+    pass
+
+
+def _retry_notice(progress, action, stage=None):
+    def on_retry(attempt, delay, exc):
+        if stage is not None:
+            stage.count_retry()
+        progress(f"{action}失败，{delay:.1f} 秒后第 {attempt} 次重试: {str(exc)}")
+    return on_retry
+
+
+def _rate_limited(key, func):
+    """包装API调用: 先经过该键的共享限流器，再根据结果调整速率和并发"""
+    limiter = get_rate_limiter(key)
+
+    def _call(*args, **kwargs):
+        with limiter.slot() as waited:
+            if waited >= 0.001:
+                get_metrics().record("rate_limit_wait", waited)
+            return func(*args, **kwargs)
+    return _call
+
+
+def upload_file(backend, file_path, progress=None):
+    """以流的方式上传PDF，遇到临时错误自动重试
+
+    内存占用与PDF大小无关，上传的同时计算内容哈希。返回 (file_id, 上传内容的SHA-256)。
+    """
+    progress = progress or _no_progress
+    pdf_file = Path(file_path)
+
+    upload = _rate_limited(FILES_KEY, backend.upload)
+
+    def _upload():
+        with HashingReader(file_path) as reader:
+            file_id = upload(pdf_file.stem, reader)
+            return file_id, reader.hexdigest()
+
+    with get_metrics().stage("upload", bytes=os.path.getsize(file_path)) as stage:
+        return retry_call(_upload, on_retry=_retry_notice(progress, "上传", stage))
+
+
+def get_signed_url(backend, file_id, progress=None):
+    """获取已上传文件的签名URL"""
+    progress = progress or _no_progress
+    with get_metrics().stage("signed_url") as stage:
+        return retry_call(_rate_limited(FILES_KEY, backend.get_signed_url), file_id,
+                          on_retry=_retry_notice(progress, "获取签名URL", stage))
+
+
+def process_document_url(backend, document_url, model, progress=None, image=False):
+    """对文档URL（或图片URL，image=True）调用OCR，返回 response_dict"""
+    progress = progress or _no_progress
+    with get_metrics().stage("ocr") as stage:
+        response_dict = retry_call(_rate_limited(model, backend.process), document_url, model, image=image,
+                                   on_retry=_retry_notice(progress, "OCR请求", stage))
+        stage.pages = len(response_dict.get("pages", []))
+        return response_dict
+
+
+def delete_uploaded_file(backend, file_id, progress=None):
+    """删除已上传的文件，失败时只给出警告，返回是否删除成功"""
+    progress = progress or _no_progress
+    with get_metrics().stage("delete") as stage:
+        try:
+            retry_call(_rate_limited(FILES_KEY, backend.delete), file_id,
+                       on_retry=_retry_notice(progress, "删除临时文件", stage))
+            progress("临时文件已删除")
+            return True
+        except Exception as e:
+            stage.status = "error"
+            progress(f"警告: 无法删除临时文件: {str(e)}")
+            return False
+
+
+def fits_inline(file_path, inline_max_bytes=DEFAULT_INLINE_MAX_BYTES):
+    """文件是否小到可以内联发送，inline_max_bytes 为0时总是上传"""
+    return inline_max_bytes > 0 and os.path.getsize(file_path) <= inline_max_bytes
+
+
+def ocr_inline(backend, file_path, model, progress=None):
+    """把PDF或图片编码为 base64 data URL 直接调用OCR，不经过上传
+
+    返回 (response_dict, 发送内容的SHA-256)。
+    """
+    progress = progress or _no_progress
+    image = is_image_file(file_path)
+    mime_type = IMAGE_MIME_TYPES[Path(file_path).suffix.lower()] if image else "application/pdf"
+
+    with get_metrics().stage("inline_encode", bytes=os.path.getsize(file_path)):
+        with open(file_path, "rb") as f:
+            content = f.read()
+        data_url = f"data:{mime_type};base64,{base64.b64encode(content).decode('ascii')}"
+        content_sha256 = hashlib.sha256(content).hexdigest()
+        del content
+
+    progress("OCR处理中...")
+    return process_document_url(backend, data_url, model, progress, image=image), content_sha256
+
+
+def ocr_file(backend, file_path, model, progress=None, inline_max_bytes=DEFAULT_INLINE_MAX_BYTES,
+             on_upload=None):
+    """上传单个PDF或图片 → 获取签名URL → 调用OCR，结束后删除已上传的文件
+
+    不超过 inline_max_bytes 的小文件直接以 data URL 内联发送。
+    每个API调用在遇到网络错误、429或5xx时按指数退避重试。
+    on_upload 在上传后以 file_id、删除成功后以 None 调用，调用方可借此记录中断时残留的上传文件。
+    返回 (response_dict, 上传内容的SHA-256)。
+    """
+    progress = progress or _no_progress
+    if fits_inline(file_path, inline_max_bytes):
+        return ocr_inline(backend, file_path, model, progress)
+
+    file_id = None
+    try:
+        progress("上传文件中...")
+        file_id, uploaded_sha256 = upload_file(backend, file_path, progress)
+        if on_upload is not None:
+            on_upload(file_id)
+        document_url = get_signed_url(backend, file_id, progress)
+
+        progress("OCR处理中...")
+        response_dict = process_document_url(backend, document_url, model, progress,
+                                             image=is_image_file(file_path))
+        return response_dict, uploaded_sha256
+    finally:
+        # 清理上传的文件
+        if file_id and delete_uploaded_file(backend, file_id, progress) and on_upload is not None:
+            on_upload(None)
+
+
+def ocr_file_chunked(backend, file_path, model, chunk_pages, max_workers=DEFAULT_CHUNK_WORKERS, progress=None,
+                     inline_max_bytes=DEFAULT_INLINE_MAX_BYTES):
+    """按页码范围拆分大PDF，并发OCR各分块后按原顺序拼接结果
+
+    拼接后的页码与整份文档一次性OCR一致，单个分块失败时整体抛出异常。
+    拆分后足够小的分块同样以 data URL 内联发送。
+    """
+    progress = progress or _no_progress
+    if is_image_file(file_path):
+        return ocr_file(backend, file_path, model, progress, inline_max_bytes)[0]
+    ranges = page_ranges(pdf_page_count(file_path), chunk_pages)
+    if len(ranges) <= 1:
+        return ocr_file(backend, file_path, model, progress, inline_max_bytes)[0]
+
+    with tempfile.TemporaryDirectory(prefix="ocr_chunks_") as chunk_folder:
+        with get_metrics().stage("split", pages=ranges[-1][1]):
+            chunk_paths = split_pdf(file_path, ranges, chunk_folder)
+        progress(f"OCR处理中（共 {len(chunk_paths)} 个分块）...")
+
+        chunk_responses = [None] * len(chunk_paths)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(in_current_context(ocr_file), backend, chunk_path, model,
+                                inline_max_bytes=inline_max_bytes): chunk_idx
+                for chunk_idx, chunk_path in enumerate(chunk_paths)
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                chunk_responses[futures[future]], _ = future.result()
+                progress(f"OCR处理中（已完成 {done}/{len(chunk_paths)} 个分块）...")
+
+    return merge_chunk_responses(chunk_responses, ranges)
+
+
+def plan_pages(file_path, model, progress=None, hybrid=False, page_cache=None):
+    """按页决定每页结果的来源，返回 (known_pages, ocr_indexes, page_hashes)
+
+    known_pages 为 {页码: 页面}：hybrid 为 True 时带文字层的页直接读取；传入 page_cache（OcrCache）时，
+    内容哈希未变化的页复用之前的OCR结果。ocr_indexes 为仍需OCR的页码，
+    page_hashes 为这些页的内容哈希（未使用分页缓存时为空），OCR后用于写回缓存。
+    """
+    progress = progress or _no_progress
+    known_pages = {}
+    if hybrid:
+        progress("正在读取PDF文字层...")
+        with get_metrics().stage("text_layer") as stage:
+            known_pages, ocr_indexes = split_text_pages(file_path)
+            stage.pages = len(known_pages)
+        if known_pages:
+            progress(f"{len(known_pages)} 页使用文字层，{len(ocr_indexes)} 页需要OCR")
+    else:
+        ocr_indexes = list(range(pdf_page_count(file_path)))
+
+    page_hashes = {}
+    if page_cache is not None and ocr_indexes:
+        with get_metrics().stage("page_cache_lookup", pages=len(ocr_indexes)) as stage:
+            page_hashes = pdf_page_hashes(file_path, ocr_indexes)
+            cached_pages = page_cache.get_pages(page_hashes.values(), model)
+            reused = [page_index for page_index in ocr_indexes if page_hashes[page_index] in cached_pages]
+            for page_index in reused:
+                known_pages[page_index] = OcrPage(cached_pages[page_hashes[page_index]]).with_index(page_index)
+            ocr_indexes = [page_index for page_index in ocr_indexes if page_index not in known_pages]
+            page_hashes = {page_index: page_hashes[page_index] for page_index in ocr_indexes}
+            stage.status = "hit" if reused else "miss"
+        if reused:
+            progress(f"{len(reused)} 页内容未变化，复用之前的OCR结果，{len(ocr_indexes)} 页需要OCR")
+    return known_pages, ocr_indexes, page_hashes
+
+
+def ocr_file_by_pages(backend, file_path, model, plan, progress=None, chunk_pages=0,
+                      chunk_workers=DEFAULT_CHUNK_WORKERS, inline_max_bytes=DEFAULT_INLINE_MAX_BYTES,
+                      on_upload=None):
+    """按 plan_pages 的结果只把仍需OCR的页组成新PDF发送OCR，与已有的页按原页码合并
+
+    结果与整份OCR的 pages 结构相同，可直接用于预览和保存；新OCR的页由调用方连同整份结果
+    写入缓存（OcrCache.put 的 page_hashes 参数）。on_upload 见 ocr_file（分块发送时各分块的上传不记录）。
+    """
+    progress = progress or _no_progress
+    known_pages, ocr_indexes, _ = plan
+    if not ocr_indexes:
+        progress("所有页面均无需OCR")
+        return merge_page_results(known_pages, ocr_indexes, None, model, file_path)
+
+    with tempfile.TemporaryDirectory(prefix="ocr_pages_") as subset_folder:
+        subset_path = os.path.join(subset_folder, f"{Path(file_path).stem}_pages.pdf")
+        with get_metrics().stage("split", pages=len(ocr_indexes)):
+            extract_pages(file_path, ocr_indexes, subset_path)
+        if chunk_pages > 0:
+            ocr_response = ocr_file_chunked(backend, subset_path, model, chunk_pages, chunk_workers, progress,
+                                            inline_max_bytes)
+        else:
+            ocr_response, _ = ocr_file(backend, subset_path, model, progress, inline_max_bytes, on_upload)
+
+    return merge_page_results(known_pages, ocr_indexes, ocr_response, model, file_path)
+
+
+def pages_with_images(response_dict):
+    """OCR结果中包含图片的页码（从0开始）"""
+    return [
+        page_idx for page_idx, page in enumerate(response_dict.get("pages", []))
+        if page.get("images")
+    ]
+
+
+def run_ocr(backend, file_path, model, image_folder, progress=None, cache=None,
+            chunk_pages=0, chunk_workers=DEFAULT_CHUNK_WORKERS, lazy_images=False,
+            inline_max_bytes=DEFAULT_INLINE_MAX_BYTES, hybrid=False):
+    """对单个PDF（或独立图片）执行 提取图片 → 上传 → 签名URL → OCR 的完整流程
+
+    返回 (response_dict, extracted_images)，不依赖任何GUI组件。传入 cache 时，相同内容和模型的
+    PDF 直接复用缓存结果，不再调用API；chunk_pages 大于0时按页分块并发OCR；
+    lazy_images 为 True 时在OCR之后只提取结果中含有图片的页；
+    不超过 inline_max_bytes 的文件跳过上传，直接以 data URL 发送；
+    hybrid 为 True 时带文字层的页直接读取，只OCR扫描页。
+    整份文档未命中缓存时按页查找，修订版中未变化的页不再重新OCR。
+    与批处理使用同一流程（run_ocr_resumable），只是任务日志不写入磁盘。
+    """
+    # ocr_journal 依赖本模块，调用时才导入
+    from ocr_journal import MemoryJournal, run_ocr_resumable
+    return run_ocr_resumable(backend, file_path, model, image_folder, MemoryJournal(), progress, cache,
+                             chunk_pages, chunk_workers, lazy_images, inline_max_bytes=inline_max_bytes,
+                             hybrid=hybrid)
@@ -0,0 +1,119 @@
+import time
+import threading
+from contextlib import contextmanager
+from ocr_retry import error_status_code
+
+
+DEFAULT_RATE = 20.0          # 每秒请求数上限
+DEFAULT_BURST = 20           # 令牌桶容量
+DEFAULT_MAX_IN_FLIGHT = 16   # 同时进行中的请求数上限
+DEFAULT_INITIAL_IN_FLIGHT = 4
+
+# 文件上传/签名URL/删除等与模型无关的请求使用的限流键
+FILES_KEY = "files"
+
+
+def is_throttle_error(exc):
+    """429 或 5xx 说明服务端已过载，需要降低速率和并发"""
+    status_code = error_status_code(exc)
+    return status_code is not None and (status_code == 429 or status_code >= 500)
+
+
+class AdaptiveRateLimiter:
+    """令牌桶限速 + AIMD 自适应并发控制
+
+    每个请求先取得一个令牌（速率不超过 rate，允许 burst 大小的突发），
+    再占用一个并发名额。请求成功时并发上限和速率按加性缓慢增长，
+    遇到 429/5xx 时按乘性减半，同一时间段内的多次失败只减半一次。
+    同一实例在进程内所有工作线程之间共享。
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST, max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+                 initial_in_flight=DEFAULT_INITIAL_IN_FLIGHT, min_rate=0.2, decrease_factor=0.5,
+                 decrease_interval=1.0):
+        self.max_rate = rate
+        self.burst = max(1, burst)
+        self.max_in_flight = max(1, max_in_flight)
+        self.min_rate = min(min_rate, rate)
+        self.decrease_factor = decrease_factor
+        self.decrease_interval = decrease_interval
+
+        self.rate = rate
+        self.limit = float(min(max(1, initial_in_flight), self.max_in_flight))
+        self.in_flight = 0
+        self._tokens = float(self.burst)
+        self._last_refill = time.monotonic()
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self):
+        """阻塞直到可以发出请求，返回等待的秒数"""
+        start = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if self.in_flight < int(self.limit):
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        self.in_flight += 1
+                        return now - start
+                    # 等待下一个令牌
+                    self._cond.wait((1 - self._tokens) / self.rate)
+                else:
+                    # 等待其他请求结束
+                    self._cond.wait()
+
+    def release(self, throttled=False, succeeded=True):
+        """请求结束: throttled 表示被限流或服务端过载，其他失败不影响速率"""
+        with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if throttled:
+                if now - self._last_decrease >= self.decrease_interval:
+                    self._last_decrease = now
+                    self._refill(now)
+                    self.limit = max(1.0, self.limit * self.decrease_factor)
+                    self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+                    self._tokens = min(self._tokens, 1.0)
+            elif succeeded:
+                # 加性增长: 大约每完成 limit 个请求并发上限加一
+                self.limit = min(float(self.max_in_flight), self.limit + 1.0 / self.limit)
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self):
+        """占用一个请求名额，根据请求结果调整速率；产出等待的秒数"""
+        waited = self.acquire()
+        try:
+            yield waited
+        except BaseException as e:
+            self.release(throttled=is_throttle_error(e), succeeded=False)
+            raise
+        self.release()
+
+
+_limiters = {}
+_limiter_settings = {}
+_limiters_lock = threading.Lock()
+
+
+def configure_rate_limit(key, rate=DEFAULT_RATE, burst=DEFAULT_BURST, max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+    """设置某个模型（或 FILES_KEY）的限流参数，需在该键首次使用前调用"""
+    with _limiters_lock:
+        _limiter_settings[key] = {"rate": rate, "burst": burst, "max_in_flight": max_in_flight}
+        _limiters.pop(key, None)
+
+
+def get_rate_limiter(key):
+    """返回进程内共享的限流器，OCR请求按模型名区分，文件相关请求使用 FILES_KEY"""
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = AdaptiveRateLimiter(**_limiter_settings.get(key, {}))
+        return limiter
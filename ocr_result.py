@@ -0,0 +1,117 @@
+from collections.abc import Mapping
+
+
+# 原始结果中没有的字段，迭代和序列化时跳过
+_MISSING = object()
+
+
+class _Record(Mapping):
+    """以 __slots__ 保存已知字段的只读记录，同时可以像 dict 一样读取
+
+    导出、索引和预览代码仍按 dict 的方式访问（get / [] / items），
+    但每条记录不再各带一个 dict；API新增的未知字段保存在 extra 中，不会丢失。
+    """
+
+    __slots__ = ("extra",)
+    FIELDS = ()
+
+    def __init__(self, values):
+        for field in self.FIELDS:
+            setattr(self, field, values.get(field, _MISSING))
+        extra = {key: value for key, value in values.items() if key not in self.FIELDS}
+        self.extra = extra or None
+
+    def __getitem__(self, key):
+        if key in self.FIELDS:
+            value = getattr(self, key)
+            if value is not _MISSING:
+                return value
+        elif self.extra is not None and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __iter__(self):
+        for field in self.FIELDS:
+            if getattr(self, field) is not _MISSING:
+                yield field
+        if self.extra is not None:
+            yield from self.extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    @classmethod
+    def from_dict(cls, values):
+        if isinstance(values, cls):
+            return values
+        return cls(values)
+
+    def to_dict(self):
+        """转换为普通的嵌套 dict，只在需要序列化时调用"""
+        return {key: _plain(self[key]) for key in self}
+
+
+def _plain(value):
+    if isinstance(value, _Record):
+        return value.to_dict()
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    return value
+
+
+def json_default(obj):
+    """供 json.dump(default=...) 使用，按需把记录转换为 dict"""
+    if isinstance(obj, _Record):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class OcrImage(_Record):
+    __slots__ = ("id", "top_left_x", "top_left_y", "bottom_right_x", "bottom_right_y", "image_base64")
+    FIELDS = __slots__
+
+
+class OcrPage(_Record):
+    __slots__ = ("index", "markdown", "images", "dimensions")
+    FIELDS = __slots__
+
+    def __init__(self, values):
+        super().__init__(values)
+        if self.images is not _MISSING:
+            self.images = tuple(image if isinstance(image, OcrImage) else OcrImage(image)
+                                for image in self.images or ())
+
+    def with_index(self, index):
+        """返回页码改为 index 的新记录（合并分块或复用缓存页时使用），其余字段按引用共享"""
+        page = object.__new__(OcrPage)
+        for field in ("extra", *self.FIELDS):
+            setattr(page, field, getattr(self, field))
+        page.index = index
+        return page
+
+
+class OcrResult(_Record):
+    """OCR结果的紧凑表示: 从 response_dict 构建一次，之后按引用传递
+
+    页面和图片为 __slots__ 记录，markdown 字符串直接引用、不复制；
+    原始数据标签页和JSON导出需要时才序列化。
+    """
+
+    __slots__ = ("pages", "model", "usage_info", "document_annotation")
+    FIELDS = __slots__
+
+    def __init__(self, values):
+        super().__init__(values)
+        if self.pages is not _MISSING:
+            self.pages = tuple(page if isinstance(page, OcrPage) else OcrPage(page) for page in self.pages or ())
+
+    @classmethod
+    def from_model(cls, response):
+        """从 SDK 返回的 OCRResponse（pydantic）构建，逐页转换为记录
+
+        不生成整份文档的嵌套 dict：每页 model_dump 后立即转换，峰值只多出一页的 dict。
+        各页仍按 SDK 的序列化规则转换，结果与整份 model_dump(mode="json") 相同。
+        """
+        values = response.model_dump(mode="json", exclude={"pages"})
+        values["pages"] = [OcrPage(page.model_dump(mode="json")) for page in response.pages]
+        return cls(values)
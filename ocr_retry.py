@@ -0,0 +1,74 @@
+import sys
+import time
+import random
+
+
+# 可重试的HTTP状态码：超时、限流和服务端错误
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+DEFAULT_RETRIES = 5
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 60.0
+
+
+def _loaded_httpx():
+    # httpx 随 mistralai SDK 按需导入；尚未导入时异常不可能来自它，无需为判断类型而导入
+    return sys.modules.get("httpx")
+
+
+def error_status_code(exc):
+    """从SDK或httpx异常中取出HTTP状态码，没有时返回 None"""
+    status_code = getattr(exc, "status_code", None)
+    httpx = _loaded_httpx()
+    if status_code is None and httpx is not None and isinstance(exc, httpx.HTTPStatusError):
+        status_code = exc.response.status_code
+    return status_code
+
+
+def is_transient_error(exc):
+    """判断异常是否为网络抖动、429限流或5xx等可重试的临时错误"""
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    httpx = _loaded_httpx()
+    if httpx is not None and isinstance(exc, httpx.TransportError):
+        return True
+    return error_status_code(exc) in TRANSIENT_STATUS_CODES
+
+
+def retry_after_seconds(exc):
+    """读取响应中的 Retry-After 头（秒），没有时返回 None"""
+    response = getattr(exc, "raw_response", None) or getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY):
+    """指数退避 + 全抖动: 在 [0, min(max_delay, base_delay * 2^attempt)] 中随机取值"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def retry_call(func, *args, retries=DEFAULT_RETRIES, base_delay=DEFAULT_BASE_DELAY,
+               max_delay=DEFAULT_MAX_DELAY, on_retry=None, **kwargs):
+    """调用 func，遇到临时错误时按指数退避重试，其余异常直接抛出
+
+    on_retry(attempt, delay, exc) 在每次等待前调用，可用于进度提示或统计重试次数。
+    """
+    attempt = 0
+    while True:
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if attempt >= retries or not is_transient_error(e):
+                raise
+            delay = retry_after_seconds(e)
+            if delay is None:
+                delay = backoff_delay(attempt, base_delay, max_delay)
+            attempt += 1
+            if on_retry is not None:
+                on_retry(attempt, delay, e)
+            time.sleep(delay)
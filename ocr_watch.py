@@ -0,0 +1,370 @@
+import os
+import sys
+import time
+import ctypes
+import ctypes.util
+import select
+import signal
+import struct
+import argparse
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from ocr_batch import (DOCUMENT_EXTENSIONS, output_dir_for, output_options_key, process_one,
+                       add_pipeline_arguments, resolve_api_key, pipeline_argument_error, pipeline_options,
+                       pipeline_resources)
+from ocr_hybrid import hybrid_result_key
+from ocr_journal import JobJournal, cleanup_orphaned_uploads, saved_unchanged, JOURNAL_FILENAME
+from ocr_metrics import get_metrics
+
+
+DEFAULT_SETTLE_SECONDS = 2.0
+DEFAULT_POLL_INTERVAL = 5.0
+
+# inotify 事件标志（见 <sys/inotify.h>）
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+# struct inotify_event { int wd; uint32_t mask, cookie, len; char name[]; }
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def _walk_files(root):
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            yield os.path.join(dirpath, filename)
+
+
+class InotifyWatcher:
+    """基于 Linux inotify（通过 ctypes 调用 libc）的目录树监视器，新建的子目录自动加入监视"""
+
+    def __init__(self, roots):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self._dirs = {}
+        try:
+            for root in roots:
+                self._add_tree(root)
+        except OSError:
+            self.close()
+            raise
+
+    def _add_tree(self, root):
+        """监视 root 及其所有子目录，返回其中已有的文件（文件可能在加入监视之前就已写入）"""
+        found = []
+        for dirpath, _, filenames in os.walk(root):
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dirpath), WATCH_MASK)
+            if wd < 0:
+                # 通常是超过了 fs.inotify.max_user_watches
+                raise OSError(ctypes.get_errno(), f"无法监视目录: {dirpath}")
+            self._dirs[wd] = dirpath
+            found.extend(os.path.join(dirpath, filename) for filename in filenames)
+        return found
+
+    def wait(self, timeout):
+        """等待最多 timeout 秒，返回写入完成的文件路径；事件队列溢出时返回 None，需要全量扫描"""
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        paths = []
+        overflowed = False
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + length].split(b"\0", 1)[0]
+            offset += _EVENT_HEADER.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                overflowed = True
+                continue
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            directory = self._dirs.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    try:
+                        paths.extend(self._add_tree(path))
+                    except OSError:
+                        overflowed = True
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                paths.append(path)
+        return None if overflowed else paths
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher:
+    """定期扫描目录树，比较文件大小和修改时间；不支持 inotify 时使用"""
+
+    def __init__(self, roots, interval=DEFAULT_POLL_INTERVAL):
+        self.roots = roots
+        self.interval = interval
+        self._snapshot = self._scan()
+        self._last_scan = time.monotonic()
+
+    def _scan(self):
+        snapshot = {}
+        for root in self.roots:
+            for path in _walk_files(root):
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                snapshot[path] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    def wait(self, timeout):
+        remaining = self.interval - (time.monotonic() - self._last_scan)
+        if remaining > timeout:
+            time.sleep(timeout)
+            return []
+        time.sleep(max(0.0, remaining))
+        snapshot = self._scan()
+        self._last_scan = time.monotonic()
+        changed = [path for path, signature in snapshot.items() if self._snapshot.get(path) != signature]
+        self._snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+
+def create_watcher(roots, polling=False, poll_interval=DEFAULT_POLL_INTERVAL, log=print):
+    """Linux 上优先使用 inotify，不可用时退回轮询"""
+    if not polling and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(roots)
+        except (OSError, AttributeError) as e:
+            log(f"inotify 不可用，改为每 {poll_interval:g} 秒轮询: {str(e)}")
+    return PollingWatcher(roots, poll_interval)
+
+
+class WatchDaemon:
+    """监视目录，把新增或修改的文档排入OCR流水线
+
+    文件大小和修改时间在 settle_seconds 内保持不变才开始处理，避免读到写了一半的文件。
+    已处理的文档记录在任务日志中，重启后不会重复处理；启动时先补处理目录中已有的积压文件。
+    targets 为 [(输入目录, 输出根目录)]，输出布局与批处理模式相同。
+    """
+
+    def __init__(self, targets, backend, model, output_format, journal, cache=None, concurrency=4,
+                 options=None, settle_seconds=DEFAULT_SETTLE_SECONDS, polling=False,
+                 poll_interval=DEFAULT_POLL_INTERVAL, metrics_file=None, log=print, index=None):
+        self.targets = [(Path(input_dir), Path(output_root)) for input_dir, output_root in targets]
+        self.backend = backend
+        self.model = model
+        self.output_format = output_format
+        self.journal = journal
+        self.cache = cache
+        self.index = index
+        self.concurrency = concurrency
+        self.options = options or {}
+        self._output_options = output_options_key(output_format, **{
+            name: value for name, value in self.options.items()
+            if name in ("image_format", "image_quality", "image_max_size")
+        })
+        self.settle_seconds = settle_seconds
+        self.polling = polling
+        self.poll_interval = poll_interval
+        self.metrics_file = metrics_file
+        self.log = log
+
+        self._pending = {}  # 路径 → (大小, 修改时间, 最近一次变化的时刻, 是否来自全量扫描)
+        self._in_flight = set()
+        self._lock = threading.Lock()
+
+    def _target_for(self, path):
+        path = Path(path)
+        # 输出目录位于输入目录内部时，不处理生成的结果
+        if any(output_root == path or output_root in path.parents for _, output_root in self.targets):
+            return None
+        for input_dir, output_root in self.targets:
+            if input_dir in path.parents:
+                return input_dir, output_root
+        return None
+
+    def _is_candidate(self, path):
+        name = os.path.basename(path)
+        if name.startswith(".") or name.startswith("~$"):
+            return False
+        return Path(path).suffix.lower() in DOCUMENT_EXTENSIONS and self._target_for(path) is not None
+
+    def _already_done(self, path, stat):
+        """任务日志中已按相同选项保存且文件大小和修改时间与计算哈希时一致时，无需计算哈希即可跳过"""
+        job = self.journal.get(os.path.abspath(path))
+        return (job is not None and saved_unchanged(job, stat)
+                and job["model"] == hybrid_result_key(self.model, self.options.get("hybrid", False))
+                and job["output_options"] == self._output_options
+                and job["output_file"] and os.path.exists(job["output_file"]))
+
+    def _scan_all(self):
+        return [path for input_dir, _ in self.targets for path in _walk_files(input_dir)]
+
+    def _note(self, paths, from_scan=False):
+        now = time.monotonic()
+        for path in paths:
+            if self._is_candidate(path):
+                # 只有全量扫描发现的文件才用日志快速跳过；文件事件说明内容可能已变化，交给哈希判断
+                quick_skip = from_scan and self._pending.get(path, (None, None, None, True))[3]
+                self._pending[path] = (None, None, now, quick_skip)
+
+    def _submit_settled(self, executor):
+        now = time.monotonic()
+        for path, (size, mtime_ns, changed_at, from_scan) in list(self._pending.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # 文件已被删除或移走
+                del self._pending[path]
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns):
+                self._pending[path] = (stat.st_size, stat.st_mtime_ns, now, from_scan)
+                continue
+            if stat.st_size == 0 or now - changed_at < self.settle_seconds:
+                continue
+            with self._lock:
+                if path in self._in_flight:
+                    # 正在处理旧版本，等它结束后再处理
+                    continue
+                del self._pending[path]
+                if from_scan and self._already_done(path, stat):
+                    continue
+                self._in_flight.add(path)
+
+            input_dir, output_root = self._target_for(path)
+            future = executor.submit(
+                process_one, path, output_dir_for(path, input_dir, output_root), self.backend, self.model,
+                self.output_format, self.journal, self.cache, index=self.index, **self.options,
+            )
+            future.add_done_callback(lambda future, path=path: self._finished(path, future))
+
+    def _finished(self, path, future):
+        with self._lock:
+            self._in_flight.discard(path)
+        try:
+            output_file = future.result()
+            if output_file is None:
+                self.log(f"跳过（已完成） {path}")
+            else:
+                self.log(f"完成 {path} -> {output_file}")
+        except Exception as e:
+            self.log(f"失败 {path}: {str(e)}")
+        if self.metrics_file:
+            get_metrics().write_prometheus_file(self.metrics_file)
+
+    def run(self, stop_event):
+        """持续运行直到 stop_event 被设置，退出前等待正在处理的文档完成"""
+        roots = [str(input_dir) for input_dir, _ in self.targets]
+        watcher = create_watcher(roots, self.polling, self.poll_interval, self.log)
+        self.log(f"正在监视 {', '.join(roots)}（{type(watcher).__name__}），按 Ctrl+C 退出")
+        tick = min(1.0, self.settle_seconds / 2) or 0.1
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                self._note(self._scan_all(), from_scan=True)
+                while not stop_event.is_set():
+                    changed = watcher.wait(tick)
+                    if changed is None:
+                        self.log("事件队列溢出，重新扫描监视目录")
+                        self._note(self._scan_all(), from_scan=True)
+                    else:
+                        self._note(changed)
+                    self._submit_settled(executor)
+                self.log("正在等待进行中的文档完成...")
+        finally:
+            watcher.close()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="mistral-ocr watch",
+        description="监视目录并自动OCR新放入或修改过的PDF和图片",
+    )
+    parser.add_argument("input_dirs", nargs="+", help="要监视的目录（递归）")
+    parser.add_argument("-o", "--output",
+                        help="输出根目录（默认: <输入目录>_ocr；监视多个目录时必须指定，各目录输出到其同名子目录）")
+    parser.add_argument("--settle-seconds", type=float, default=DEFAULT_SETTLE_SECONDS,
+                        help=f"文件保持不变多久后才开始处理（默认: {DEFAULT_SETTLE_SECONDS:g} 秒）")
+    parser.add_argument("--polling", action="store_true", help="不使用 inotify，定期扫描目录")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL,
+                        help=f"轮询间隔（默认: {DEFAULT_POLL_INTERVAL:g} 秒）")
+    add_pipeline_arguments(parser)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    api_key = resolve_api_key(args)
+    if not api_key:
+        print("错误: 请提供Mistral API Key", file=sys.stderr)
+        return 2
+
+    input_dirs = [Path(path).resolve() for path in args.input_dirs]
+    for input_dir in input_dirs:
+        if not input_dir.is_dir():
+            print(f"错误: 输入目录不存在: {input_dir}", file=sys.stderr)
+            return 2
+    if len(input_dirs) > 1:
+        if not args.output:
+            print("错误: 监视多个目录时必须用 -o 指定输出根目录", file=sys.stderr)
+            return 2
+        if len({input_dir.name for input_dir in input_dirs}) < len(input_dirs):
+            print("错误: 监视的目录不能同名", file=sys.stderr)
+            return 2
+
+    error = pipeline_argument_error(args)
+    if error:
+        print(f"错误: {error}", file=sys.stderr)
+        return 2
+
+    output_root = (Path(args.output) if args.output
+                   else input_dirs[0].with_name(f"{input_dirs[0].name}_ocr")).resolve()
+    if len(input_dirs) > 1:
+        targets = [(input_dir, output_root / input_dir.name) for input_dir in input_dirs]
+    else:
+        targets = [(input_dirs[0], output_root)]
+
+    stop_event = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop_event.set())
+
+    def log(message):
+        print(message, flush=True)
+
+    with pipeline_resources(args, api_key) as (backend, cache, index):
+        os.makedirs(output_root, exist_ok=True)
+        journal = JobJournal(os.path.join(output_root, JOURNAL_FILENAME))
+        try:
+            cleanup_orphaned_uploads(backend, journal, log)
+            daemon = WatchDaemon(
+                targets, backend, args.model, args.format, journal, cache, args.concurrency,
+                pipeline_options(args), args.settle_seconds, args.polling, args.poll_interval,
+                args.metrics_file, log, index,
+            )
+            daemon.run(stop_event)
+        finally:
+            journal.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,6 +9,8 @@ OPTIONS = {
     'argv_emulation': False,
     'iconfile': 'icons/OCRicon.icns',  # 如果你有应用图标
     'packages': ['fitz', 'markdown', 'mistralai'],
+    # 图形界面和各子命令在 ocr.py 中按需导入
+    'includes': ['ocr_gui', 'ocr_batch', 'ocr_watch', 'ocr_index'],
     'plist': {
         'CFBundleName': 'Mistral OCR',
         'CFBundleDisplayName': 'Mistral OCR',